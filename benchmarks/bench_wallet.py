@@ -0,0 +1,419 @@
+"""
+Benchmarks de los caminos críticos de la wallet, sin interfaz ni red.
+
+Mide:
+- historial: sincronización completa e incremental de SincronizadorCadena
+  sobre cadenas sintéticas (la respuesta de /blocks, serializada antes de medir,
+  se alimenta en chunks al mismo parser en streaming que usa la app) y la
+  consulta del historial;
+- hashes: calcular_tx_hash_completo y CacheHashes (frío y caliente);
+- compras: reconstrucción de "Mis Compras" (indexar_por_precio +
+  reconstruir_compras) contra catálogos grandes;
+- cripto: derivación de claves y firma de transacciones;
+- red (opcional): escanear_wallet por HTTP, en frío y en un refresco, contra
+  un nodo (--nodo URL) o contra benchmarks/servidor_simulado.py levantado en
+  el mismo proceso (--simulado).
+
+Uso (desde la raíz del repo):
+
+    python benchmarks/bench_wallet.py --salida resultados.json
+    python benchmarks/bench_wallet.py --rapido
+    python benchmarks/bench_wallet.py --solo red --simulado --latencia 0.1
+
+El resultado es JSON: metadatos de la corrida y una lista de mediciones
+{"nombre", "parametros", "segundos", "por_segundo", ...} donde `segundos` es
+la mejor de las repeticiones.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from velwallet_core import (  # noqa: E402
+    AlmacenCadena,
+    CacheHashes,
+    SincronizadorCadena,
+    cache_hashes,
+    iterar_arreglo_json,
+    calcular_tx_hash_completo,
+    derivar_wallet_oficial,
+    firmar_transaccion_nodo,
+    construir_transaccion,
+    nueva_clave_privada,
+    indexar_por_precio,
+    reconstruir_compras,
+    escanear_wallet,
+    nodo,
+)
+
+TAMANOS_HISTORIAL = (1_000, 100_000, 1_000_000)
+TAMANOS_CATALOGO = (1_000, 10_000, 100_000)
+TXS_POR_BLOQUE = 100
+# Fracción de las transacciones de la cadena que involucran a la wallet medida
+FRACCION_PROPIAS = 0.01
+TAMANO_CHUNK = 64 * 1024
+
+WALLET = derivar_wallet_oficial("1" * 64)[0]
+OTRA = derivar_wallet_oficial("2" * 64)[0]
+
+
+# --- Datos sintéticos ---
+
+def _tx_json(bloque, i, propia):
+    remitente, destinatario = (WALLET, OTRA) if propia else (OTRA, f"{bloque:020d}{i:020d}")
+    return (
+        f'{{"from": "{remitente}", "to": "{destinatario}", "amount": {i % 97 + 0.5}, '
+        f'"nonce": {bloque * TXS_POR_BLOQUE + i}, "public_key": "{"a" * 64}", '
+        f'"signature": "{bloque:032d}{i:032d}"}}'
+    )
+
+
+def _bloque_json(index, cada):
+    txs = ", ".join(
+        _tx_json(index, i, (index * TXS_POR_BLOQUE + i) % cada == 0)
+        for i in range(TXS_POR_BLOQUE)
+    )
+    previo = f"{index - 1:064d}" if index else "0"
+    return (
+        f'{{"index": {index}, "timestamp": {1700000000 + index}, '
+        f'"previous_hash": "{previo}", "block_hash": "{index:064d}", '
+        f'"transactions": [{txs}]}}'
+    )
+
+
+def serializar_cadena(hasta, cada):
+    """Bytes de cada bloque de la cadena sintética; se generan fuera de las mediciones."""
+    return [_bloque_json(index, cada).encode() for index in range(hasta)]
+
+
+def chunks_cadena(bloques_json, desde, hasta):
+    """Respuesta de /blocks?start=desde como chunks de bytes, a partir de los bloques ya serializados."""
+    buffer = [b"["]
+    tamano = 1
+    for index in range(max(desde, 0), hasta):
+        pieza = bloques_json[index]
+        if index > max(desde, 0):
+            buffer.append(b", ")
+        buffer.append(pieza)
+        tamano += len(pieza) + 2
+        if tamano >= TAMANO_CHUNK:
+            yield b"".join(buffer)
+            buffer, tamano = [], 0
+    buffer.append(b"]")
+    yield b"".join(buffer)
+
+
+class SincronizadorSintetico(SincronizadorCadena):
+    """SincronizadorCadena que lee los bloques de una cadena sintética en vez del nodo."""
+
+    def __init__(self, address, almacen, bloques_json, bloques):
+        self.bloques_json = bloques_json
+        self.bloques = bloques
+        super().__init__(address, almacen)
+
+    def _descargar_bloques(self, desde):
+        yield from iterar_arreglo_json(chunks_cadena(self.bloques_json, desde, self.bloques))
+
+
+def catalogo_sintetico(n):
+    return [
+        {"id": f"prod-{i}", "title": f"Producto {i}", "price": round(1 + i * 0.37, 2)}
+        for i in range(n)
+    ]
+
+
+# --- Medición ---
+
+def medir(fn, repeticiones, preparar=None):
+    """Mejor tiempo y promedio de `fn(preparar())` en segundos."""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        arg = preparar() if preparar else None
+        t0 = time.perf_counter()
+        resultado = fn(arg)
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos), sum(tiempos) / len(tiempos), resultado
+
+
+def registro(nombre, parametros, mejor, promedio, operaciones, **extra):
+    return dict(
+        nombre=nombre,
+        parametros=parametros,
+        segundos=round(mejor, 6),
+        promedio=round(promedio, 6),
+        por_segundo=round(operaciones / mejor, 1) if mejor > 0 else None,
+        **extra
+    )
+
+
+def bench_historial(tamanos, repeticiones, directorio):
+    resultados = []
+    cada = max(1, round(1 / FRACCION_PROPIAS))
+    for total in tamanos:
+        bloques = max(1, total // TXS_POR_BLOQUE)
+        parametros = {"transacciones": bloques * TXS_POR_BLOQUE, "bloques": bloques,
+                      "fraccion_propias": FRACCION_PROPIAS}
+        ruta = os.path.join(directorio, f"cadena_{total}.json")
+
+        # Refresco típico: 10 bloques nuevos sobre la cadena ya sincronizada
+        nuevos = 10
+        bloques_json = serializar_cadena(bloques + nuevos, cada)
+
+        def preparar_completa():
+            AlmacenCadena(ruta).borrar()
+            cache_hashes.borrar()
+            return SincronizadorSintetico(WALLET, AlmacenCadena(ruta), bloques_json, bloques)
+
+        def completa(s):
+            s.sincronizar()
+            return s
+
+        mejor, promedio, sincronizador = medir(completa, repeticiones, preparar_completa)
+        propias = len(sincronizador.transacciones_de(WALLET))
+        resultados.append(registro(
+            "historial.sincronizacion_completa", parametros, mejor, promedio,
+            parametros["transacciones"], transacciones_propias=propias
+        ))
+
+        def preparar_incremental():
+            # Cada repetición parte de la cadena recién sincronizada
+            AlmacenCadena(ruta).guardar(sincronizador.estado)
+            return SincronizadorSintetico(WALLET, AlmacenCadena(ruta), bloques_json, bloques + nuevos)
+
+        mejor, promedio, _ = medir(completa, repeticiones, preparar_incremental)
+        resultados.append(registro(
+            "historial.sincronizacion_incremental",
+            dict(parametros, bloques_nuevos=nuevos), mejor, promedio, nuevos * TXS_POR_BLOQUE
+        ))
+
+        mejor, promedio, _ = medir(
+            lambda _: SincronizadorCadena(WALLET, AlmacenCadena(ruta)), repeticiones
+        )
+        resultados.append(registro(
+            "historial.carga_desde_disco", dict(parametros, transacciones_propias=propias),
+            mejor, promedio, propias
+        ))
+
+        mejor, promedio, _ = medir(
+            lambda _: sincronizador.transacciones_de(WALLET), max(repeticiones, 5)
+        )
+        resultados.append(registro(
+            "historial.transacciones_de", dict(parametros, transacciones_propias=propias),
+            mejor, promedio, propias
+        ))
+        AlmacenCadena(ruta).borrar()
+    return resultados
+
+
+def bench_hashes(repeticiones, directorio, n=100_000):
+    txs = [
+        {"from": WALLET, "to": OTRA, "amount": i * 0.5, "nonce": i,
+         "public_key": "a" * 64, "signature": f"{i:064d}"}
+        for i in range(n)
+    ]
+    resultados = []
+
+    mejor, promedio, _ = medir(
+        lambda _: [calcular_tx_hash_completo(tx) for tx in txs], repeticiones
+    )
+    resultados.append(registro("hashes.calcular_tx_hash_completo", {"transacciones": n},
+                               mejor, promedio, n))
+
+    almacen = AlmacenCadena(os.path.join(directorio, "hashes.json"))
+    mejor, promedio, _ = medir(
+        lambda cache: cache.hashes(txs), repeticiones,
+        lambda: CacheHashes(maximo=n, almacen=almacen)
+    )
+    resultados.append(registro("hashes.cache_fria", {"transacciones": n}, mejor, promedio, n))
+
+    cache = CacheHashes(maximo=n, almacen=almacen)
+    cache.hashes(txs)
+    mejor, promedio, _ = medir(lambda _: cache.hashes(txs), repeticiones)
+    resultados.append(registro("hashes.cache_caliente", {"transacciones": n}, mejor, promedio, n))
+    return resultados
+
+
+def bench_compras(tamanos, repeticiones, pagos=1_000):
+    resultados = []
+    for n in tamanos:
+        productos = catalogo_sintetico(n)
+        # Pagos a precios del catálogo (y algunos que no coinciden con ningún producto)
+        historial = [
+            {"monto": productos[(i * 7919) % n]["price"] if i % 10 else 0.123,
+             "timestamp": i, "tx_hash_completo": f"{i:064d}"}
+            for i in range(pagos)
+        ]
+
+        mejor, promedio, indice = medir(lambda _: indexar_por_precio(productos), repeticiones)
+        resultados.append(registro("compras.indexar_por_precio", {"productos": n},
+                                   mejor, promedio, n))
+
+        mejor, promedio, compras = medir(
+            lambda _: reconstruir_compras(historial, indice, []), repeticiones
+        )
+        resultados.append(registro(
+            "compras.reconstruir_compras", {"productos": n, "pagos": pagos},
+            mejor, promedio, pagos, compras_encontradas=len(compras)
+        ))
+    return resultados
+
+
+def bench_cripto(repeticiones, n=10_000):
+    claves = [nueva_clave_privada() for _ in range(n)]
+    _, pub, _ = derivar_wallet_oficial(claves[0])
+    resultados = []
+
+    mejor, promedio, _ = medir(lambda _: [derivar_wallet_oficial(c) for c in claves], repeticiones)
+    resultados.append(registro("cripto.derivar_wallet_oficial", {"claves": n}, mejor, promedio, n))
+
+    mejor, promedio, _ = medir(
+        lambda _: [firmar_transaccion_nodo(pub, WALLET, OTRA, 1.5, i) for i in range(n)],
+        repeticiones
+    )
+    resultados.append(registro("cripto.firmar_transaccion_nodo", {"firmas": n}, mejor, promedio, n))
+
+    mejor, promedio, _ = medir(
+        lambda _: [construir_transaccion(WALLET, pub, OTRA, 1.5, i) for i in range(n)],
+        repeticiones
+    )
+    resultados.append(registro("cripto.construir_transaccion", {"transacciones": n},
+                               mejor, promedio, n))
+    return resultados
+
+
+def bench_red(url, repeticiones, directorio, **extra):
+    """escanear_wallet contra un nodo real o simulado, como lo hace la app."""
+    nodo.base_url = url.rstrip('/')
+    ruta = os.path.join(directorio, "cadena_red.json")
+
+    def preparar_frio():
+        AlmacenCadena(ruta).borrar()
+        cache_hashes.borrar()
+        return SincronizadorCadena(WALLET, AlmacenCadena(ruta))
+
+    def escanear(s):
+        return escanear_wallet(WALLET, s)
+
+    mejor, promedio, estado = medir(escanear, repeticiones, preparar_frio)
+    parametros = dict(extra, altura=estado["altura"], transacciones_propias=len(estado["historial"]))
+    resultados = [registro("red.escaneo_inicial", parametros, mejor, promedio, 1)]
+
+    # Refresco sin bloques nuevos: lo que cuesta cada actualizar_todo
+    mejor, promedio, _ = medir(
+        escanear, repeticiones, lambda: SincronizadorCadena(WALLET, AlmacenCadena(ruta))
+    )
+    resultados.append(registro("red.escaneo_refresco", parametros, mejor, promedio, 1))
+    AlmacenCadena(ruta).borrar()
+    return resultados
+
+
+def correr_bench_red(args, transacciones, directorio):
+    if args.nodo:
+        return bench_red(args.nodo, args.repeticiones, directorio, nodo=args.nodo)
+    from servidor_simulado import iniciar_en_segundo_plano
+
+    bloques = max(1, transacciones // TXS_POR_BLOQUE)
+    servidor, url = iniciar_en_segundo_plano(
+        bloques=bloques, txs_por_bloque=TXS_POR_BLOQUE,
+        fraccion_propias=FRACCION_PROPIAS, latencia=args.latencia
+    )
+    try:
+        return bench_red(url, args.repeticiones, directorio, nodo="simulado",
+                         transacciones=bloques * TXS_POR_BLOQUE, latencia=args.latencia)
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, stdout)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--tamanos", default=",".join(map(str, TAMANOS_HISTORIAL)),
+                        help="transacciones de las cadenas sintéticas, separadas por coma")
+    parser.add_argument("--catalogos", default=",".join(map(str, TAMANOS_CATALOGO)),
+                        help="productos de los catálogos sintéticos, separados por coma")
+    parser.add_argument("--solo", action="append",
+                        choices=("historial", "hashes", "compras", "cripto", "red"),
+                        help="correr solo estos grupos (se puede repetir)")
+    parser.add_argument("--nodo", help="URL del nodo para el grupo red")
+    parser.add_argument("--simulado", action="store_true",
+                        help="levantar el servidor simulado para el grupo red (cadena del mayor de --tamanos)")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="latencia por petición del servidor simulado, en segundos")
+    parser.add_argument("--rapido", action="store_true",
+                        help="tamaños chicos y una repetición (para CI)")
+    args = parser.parse_args(argv)
+
+    if args.rapido:
+        args.repeticiones = 1
+        args.tamanos = "1000,10000"
+        args.catalogos = "1000"
+    tamanos = [int(t) for t in args.tamanos.split(",") if t]
+    catalogos = [int(t) for t in args.catalogos.split(",") if t]
+    grupos = set(args.solo or ("historial", "hashes", "compras", "cripto"))
+    if args.nodo or args.simulado:
+        grupos.add("red")
+    if "red" in grupos and not (args.nodo or args.simulado):
+        parser.error("el grupo red necesita --nodo URL o --simulado")
+
+    resultados = []
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="velwallet-bench-") as directorio:
+        # Los cachés del núcleo escriben en el directorio actual
+        os.chdir(directorio)
+        try:
+            if "historial" in grupos:
+                resultados += bench_historial(tamanos, args.repeticiones, directorio)
+            if "hashes" in grupos:
+                resultados += bench_hashes(args.repeticiones, directorio)
+            if "compras" in grupos:
+                resultados += bench_compras(catalogos, args.repeticiones)
+            if "cripto" in grupos:
+                resultados += bench_cripto(args.repeticiones)
+            if "red" in grupos:
+                resultados += correr_bench_red(args, max(tamanos), directorio)
+        finally:
+            os.chdir(directorio_original)
+
+    informe = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticiones": args.repeticiones,
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(texto + "\n")
+        for r in resultados:
+            print(f"{r['nombre']:40} {r['segundos']:>10.4f}s  {json.dumps(r['parametros'])}",
+                  file=sys.stderr)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Servidor local que simula el nodo VelCoin y el marketplace, para medir la app
+y los benchmarks con tamaño de cadena, latencia y tasa de errores controlados.
+
+    python benchmarks/servidor_simulado.py --bloques 1000 --latencia 0.08 --tasa-error 0.02
+
+Implementa, en un solo puerto:
+- nodo: /balance/<addr>, /blocks?start=N, /mempool, /send, /mine, /tx/<hash>;
+- marketplace: /auth/challenge, /auth/verify, /products (GET con ETag/304 y
+  POST), /buy, /check_purchase/<id>, /download/<id>.
+
+Al arrancar imprime una clave privada de prueba con saldo y las variables de
+entorno para apuntar la app (ver velwallet_core/config.py). Solo se indexan
+por hash las transacciones de la wallet de prueba y las enviadas con /send.
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from velwallet_core import (  # noqa: E402
+    WALLET_FUNDADORA,
+    sha256,
+    derivar_wallet_oficial,
+    firmar_transaccion_nodo,
+    firmar_challenge,
+    calcular_tx_hash_completo,
+)
+
+CLAVE_DEMO = "1" * 64
+SALDO_INICIAL_DEMO = 1_000_000
+# Direcciones que generan el resto del tráfico de la cadena sintética
+DIRECCIONES_RELLENO = 200
+TTL_SESION = 15 * 60
+
+
+class EstadoSimulado:
+    """Cadena, mempool, saldos, catálogo y sesiones del servidor simulado."""
+
+    def __init__(self, bloques=100, txs_por_bloque=100, fraccion_propias=0.01,
+                 productos=50, clave_demo=CLAVE_DEMO, fundadora=WALLET_FUNDADORA, semilla=1):
+        self.lock = threading.Lock()
+        self.random = random.Random(semilla)
+        self.wallet_demo, self.pub_demo, _ = derivar_wallet_oficial(clave_demo)
+        self.fundadora = fundadora
+
+        self.bloques = []          # bytes de cada bloque serializado
+        self.ultimo_hash = "0"
+        self.saldos = defaultdict(float)
+        self.txs = {}              # hash -> (tx, block_index, block_hash); block_index None si está en el mempool
+        self.mempool = []
+
+        self.productos = [
+            {"id": f"prod-{i}", "title": f"Producto simulado {i}",
+             "description": f"Producto de prueba número {i}", "price": round(1 + i * 1.5, 2),
+             "category": "Simulado", "type": "digital"}
+            for i in range(productos)
+        ]
+        self.version_catalogo = 1
+        self.reservas = defaultdict(set)   # wallet -> product_ids pedidos con /buy
+        self.pagos = defaultdict(list)     # wallet -> montos enviados a la fundadora
+        self.challenges = {}
+        self.sesiones = {}                 # token -> (wallet, expira)
+
+        self._generar(bloques, txs_por_bloque, fraccion_propias)
+
+    # --- Cadena ---
+
+    def _generar(self, bloques, txs_por_bloque, fraccion_propias):
+        relleno = [sha256(f"relleno-{i}")[:40] for i in range(DIRECCIONES_RELLENO)]
+        cada = max(1, round(1 / fraccion_propias)) if fraccion_propias > 0 else None
+        tx_genesis = {"from": "0" * 40, "to": self.wallet_demo, "amount": float(SALDO_INICIAL_DEMO),
+                      "nonce": 0, "public_key": "", "signature": "genesis"}
+        self._agregar_bloque([tx_genesis], indexar=[tx_genesis])
+
+        nonce = 1
+        for _ in range(1, bloques):
+            txs, propias = [], []
+            for _ in range(txs_por_bloque):
+                if cada and nonce % cada == 0:
+                    otra = self.random.choice(relleno)
+                    # La wallet de prueba recibe más de lo que envía para que siempre tenga saldo
+                    if nonce % (2 * cada) == 0:
+                        tx = self._tx(self.wallet_demo, otra, self.random.randint(1, 50), nonce, self.pub_demo)
+                    else:
+                        tx = self._tx(otra, self.wallet_demo, self.random.randint(10, 100), nonce)
+                    propias.append(tx)
+                else:
+                    origen, destino = self.random.sample(relleno, 2)
+                    tx = self._tx(origen, destino, self.random.randint(1, 1000), nonce)
+                txs.append(tx)
+                nonce += 1
+            self._agregar_bloque(txs, indexar=propias)
+
+    def _tx(self, origen, destino, monto, nonce, public_key=None):
+        return {"from": origen, "to": destino, "amount": float(monto), "nonce": nonce,
+                "public_key": public_key or sha256(origen), "signature": sha256(f"{origen}{nonce}")}
+
+    def _agregar_bloque(self, txs, indexar=()):
+        index = len(self.bloques)
+        block_hash = sha256(f"{index}{self.ultimo_hash}{len(txs)}")
+        bloque = {"index": index, "timestamp": int(time.time()) - 10 * (10_000 - index),
+                  "previous_hash": self.ultimo_hash, "block_hash": block_hash,
+                  "transactions": txs}
+        self.bloques.append(json.dumps(bloque).encode())
+        self.ultimo_hash = block_hash
+        for tx in txs:
+            self.saldos[tx["from"]] -= tx["amount"]
+            self.saldos[tx["to"]] += tx["amount"]
+        for tx in indexar:
+            self.txs[calcular_tx_hash_completo(tx)] = (tx, index, block_hash)
+        return index
+
+    def recibir_tx(self, tx):
+        """Valida una transacción de /send y la agrega al mempool. Devuelve (hash, error)."""
+        campos = ("from", "to", "amount", "nonce", "public_key", "signature")
+        if any(tx.get(c) in (None, "") for c in campos):
+            return None, "Missing fields"
+        if sha256(tx["public_key"])[:40] != tx["from"]:
+            return None, "Public key does not match sender"
+        firma = firmar_transaccion_nodo(tx["public_key"], tx["from"], tx["to"], tx["amount"], tx["nonce"])
+        if firma != tx["signature"]:
+            return None, "Invalid signature"
+        tx = {c: tx[c] for c in campos}
+        with self.lock:
+            pendiente = sum(t["amount"] for t in self.mempool if t["from"] == tx["from"])
+            if self.saldos[tx["from"]] - pendiente < float(tx["amount"]):
+                return None, "Insufficient balance"
+            tx_hash = calcular_tx_hash_completo(tx)
+            if tx_hash in self.txs:
+                return None, "Duplicate transaction"
+            self.mempool.append(tx)
+            self.txs[tx_hash] = (tx, None, None)
+            if tx["to"] == self.fundadora:
+                self.pagos[tx["from"]].append(float(tx["amount"]))
+        return tx_hash, None
+
+    def minar(self):
+        with self.lock:
+            if not self.mempool:
+                return None
+            txs, self.mempool = self.mempool, []
+            return self._agregar_bloque(txs, indexar=txs)
+
+    def respuesta_bloques(self, desde):
+        """Partes de la respuesta de /blocks?start=desde y su largo total."""
+        with self.lock:
+            bloques = self.bloques[max(desde, 0):]
+        largo = 2 + sum(len(b) for b in bloques) + 2 * max(len(bloques) - 1, 0)
+
+        def partes():
+            yield b"["
+            for i, b in enumerate(bloques):
+                yield (b", " + b) if i else b
+            yield b"]"
+        return partes(), largo
+
+    def consultar_tx(self, tx_hash):
+        with self.lock:
+            encontrada = self.txs.get(tx_hash)
+        if encontrada is None:
+            return None
+        tx, block_index, block_hash = encontrada
+        if block_index is None:
+            return dict(tx, hash=tx_hash, status="pending")
+        return dict(tx, hash=tx_hash, status="confirmed", block_index=block_index, block_hash=block_hash)
+
+    # --- Marketplace ---
+
+    def etag(self):
+        return f'"catalogo-{self.version_catalogo}"'
+
+    def nuevo_challenge(self, wallet):
+        challenge = secrets.token_hex(16)
+        with self.lock:
+            self.challenges[wallet] = challenge
+        return challenge
+
+    def verificar(self, wallet, public_key, signature):
+        """Devuelve un token de sesión si la firma del challenge es válida."""
+        with self.lock:
+            challenge = self.challenges.pop(wallet, None)
+        if not challenge or not public_key or sha256(public_key)[:40] != wallet:
+            return None
+        if firmar_challenge(public_key, challenge) != signature:
+            return None
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sesiones[token] = (wallet, time.time() + TTL_SESION)
+        return token
+
+    def wallet_de_sesion(self, token):
+        with self.lock:
+            sesion = self.sesiones.get(token)
+        if sesion is None or sesion[1] < time.time():
+            return None
+        return sesion[0]
+
+    def producto(self, product_id):
+        return next((p for p in self.productos if p["id"] == product_id), None)
+
+    def comprado(self, wallet, product_id):
+        producto = self.producto(product_id)
+        if producto is None or product_id not in self.reservas[wallet]:
+            return False
+        return any(abs(monto - float(producto["price"])) < 0.01 for monto in self.pagos[wallet])
+
+
+class ManejadorSimulado(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def estado(self):
+        return self.server.estado
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    # --- Respuestas ---
+
+    def responder(self, codigo, cuerpo=None, encabezados=None):
+        datos = b"" if cuerpo is None else json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        if cuerpo is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        for clave, valor in (encabezados or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def leer_json(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        if not largo:
+            return {}
+        try:
+            return json.loads(self.rfile.read(largo))
+        except ValueError:
+            return {}
+
+    def simular_red(self):
+        """Aplica la latencia configurada; devuelve False si esta petición debe fallar."""
+        latencia = self.server.latencia + self.server.random.uniform(0, self.server.jitter)
+        if latencia > 0:
+            time.sleep(latencia)
+        if self.server.random.random() < self.server.tasa_error:
+            self.leer_json()
+            self.responder(503, {"error": "Error simulado"})
+            return False
+        return True
+
+    def wallet_autenticada(self):
+        for parte in (self.headers.get("Cookie") or "").split(";"):
+            nombre, _, valor = parte.strip().partition("=")
+            if nombre == "session":
+                return self.estado.wallet_de_sesion(valor)
+        return None
+
+    # --- Ruteo ---
+
+    def do_GET(self):
+        if not self.simular_red():
+            return
+        url = urlsplit(self.path)
+        partes = url.path.strip("/").split("/")
+        consulta = parse_qs(url.query)
+
+        if partes[0] == "balance" and len(partes) == 2:
+            return self.responder(200, {"balance": round(self.estado.saldos.get(partes[1], 0.0), 8)})
+        if partes[0] == "blocks":
+            return self.enviar_bloques(int(consulta.get("start", ["0"])[0] or 0))
+        if partes[0] == "mempool":
+            with self.estado.lock:
+                return self.responder(200, list(self.estado.mempool))
+        if partes[0] == "tx" and len(partes) == 2:
+            tx = self.estado.consultar_tx(partes[1])
+            if tx is None:
+                return self.responder(404, {"error": "Transaction not found"})
+            return self.responder(200, tx)
+        if partes[0] == "products":
+            return self.listar_productos()
+        if partes[0] == "check_purchase" and len(partes) == 2:
+            wallet = self.wallet_autenticada()
+            if not wallet:
+                return self.responder(401, {"error": "Not authenticated"})
+            return self.responder(200, {"purchased": self.estado.comprado(wallet, partes[1])})
+        if partes[0] == "download" and len(partes) == 2:
+            return self.descargar(partes[1], consulta)
+        self.responder(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self.simular_red():
+            return
+        ruta = urlsplit(self.path).path.strip("/")
+        datos = self.leer_json()
+
+        if ruta == "send":
+            tx_hash, error = self.estado.recibir_tx(datos)
+            if error:
+                return self.responder(400, {"accepted": False, "error": error})
+            return self.responder(200, {"accepted": True, "tx_hash": tx_hash})
+        if ruta == "mine":
+            index = self.estado.minar()
+            if index is None:
+                return self.responder(200, {"success": False, "error": "No transactions to mine"})
+            return self.responder(200, {"success": True, "block": {"index": index}})
+        if ruta == "auth/challenge":
+            if not datos.get("wallet"):
+                return self.responder(400, {"error": "Missing wallet"})
+            return self.responder(200, {"challenge": self.estado.nuevo_challenge(datos["wallet"])})
+        if ruta == "auth/verify":
+            token = self.estado.verificar(datos.get("wallet"), datos.get("public_key"), datos.get("signature"))
+            if not token:
+                return self.responder(401, {"error": "Invalid signature"})
+            cookie = f"session={token}; Max-Age={TTL_SESION}; Path=/; HttpOnly"
+            return self.responder(200, {"success": True}, {"Set-Cookie": cookie})
+        if ruta == "products":
+            return self.crear_producto(datos)
+        if ruta == "buy":
+            return self.comprar(datos.get("product_id"))
+        self.responder(404, {"error": "Not found"})
+
+    # --- Endpoints ---
+
+    def enviar_bloques(self, desde):
+        partes, largo = self.estado.respuesta_bloques(desde)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(largo))
+        self.end_headers()
+        for parte in partes:
+            self.wfile.write(parte)
+
+    def listar_productos(self):
+        with self.estado.lock:
+            etag = self.estado.etag()
+            productos = list(self.estado.productos)
+        if self.headers.get("If-None-Match") == etag:
+            return self.responder(304, encabezados={"ETag": etag})
+        self.responder(200, productos, {"ETag": etag})
+
+    def crear_producto(self, datos):
+        wallet = self.wallet_autenticada()
+        if not wallet:
+            return self.responder(401, {"error": "Not authenticated"})
+        if wallet != self.estado.fundadora:
+            return self.responder(403, {"error": "Only the founder wallet can add products"})
+        if not datos.get("title") or datos.get("price_vlc") is None:
+            return self.responder(400, {"error": "Missing fields"})
+        with self.estado.lock:
+            producto = {
+                "id": f"prod-{secrets.token_hex(4)}",
+                "title": datos["title"],
+                "description": datos.get("description", ""),
+                "price": datos["price_vlc"],
+                "category": datos.get("category", "General"),
+                "type": datos.get("type", "digital"),
+            }
+            self.estado.productos.append(producto)
+            self.estado.version_catalogo += 1
+        self.responder(200, {"success": True, "product": producto})
+
+    def comprar(self, product_id):
+        wallet = self.wallet_autenticada()
+        if not wallet:
+            return self.responder(401, {"error": "Not authenticated"})
+        producto = self.estado.producto(product_id)
+        if producto is None:
+            return self.responder(404, {"error": "Product not found"})
+        if self.estado.comprado(wallet, product_id):
+            return self.responder(400, {"error": "Already purchased"})
+        with self.estado.lock:
+            self.estado.reservas[wallet].add(product_id)
+        self.responder(200, {"success": True, "product_id": product_id, "price": producto["price"]})
+
+    def descargar(self, product_id, consulta):
+        wallet = self.wallet_autenticada()
+        if not wallet and "signature" in consulta:
+            # Enlace firmado (ver url_descarga_firmada)
+            dato = {k: v[0] for k, v in consulta.items()}
+            try:
+                vigente = int(dato.get("expires", 0)) > time.time()
+            except ValueError:
+                vigente = False
+            pub = dato.get("pubkey", "")
+            esperada = sha256(sha256(pub) + f"{dato.get('wallet')}:{product_id}:{dato.get('expires')}")
+            if vigente and sha256(pub)[:40] == dato.get("wallet") and esperada == dato["signature"]:
+                wallet = dato["wallet"]
+        if not wallet:
+            return self.responder(401, {"error": "Not authenticated"})
+        if not self.estado.comprado(wallet, product_id):
+            return self.responder(403, {"error": "Not purchased"})
+        contenido = f"Contenido simulado de {product_id}\n".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+
+def crear_servidor(host="127.0.0.1", puerto=0, latencia=0.0, jitter=0.0, tasa_error=0.0,
+                   verboso=False, semilla=1, **opciones_estado):
+    """ThreadingHTTPServer con el estado simulado; puerto=0 elige uno libre."""
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorSimulado)
+    servidor.daemon_threads = True
+    servidor.estado = EstadoSimulado(semilla=semilla, **opciones_estado)
+    servidor.latencia = latencia
+    servidor.jitter = jitter
+    servidor.tasa_error = tasa_error
+    servidor.verboso = verboso
+    servidor.random = random.Random(semilla)
+    return servidor
+
+
+def iniciar_en_segundo_plano(**opciones):
+    """Arranca el servidor en un hilo y devuelve (servidor, url)."""
+    servidor = crear_servidor(**opciones)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    host, puerto = servidor.server_address[:2]
+    return servidor, f"http://{host}:{puerto}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nodo VelCoin y marketplace simulados.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--bloques", type=int, default=100, help="largo de la cadena inicial")
+    parser.add_argument("--txs-por-bloque", type=int, default=100)
+    parser.add_argument("--fraccion-propias", type=float, default=0.01,
+                        help="fracción de transacciones que involucran a la wallet de prueba")
+    parser.add_argument("--productos", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos agregados a cada respuesta")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latencia extra aleatoria máxima")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="probabilidad de responder 503")
+    parser.add_argument("--clave-demo", default=CLAVE_DEMO, help="clave privada de la wallet con saldo")
+    parser.add_argument("--fundadora", default=WALLET_FUNDADORA,
+                        help="wallet que cobra las compras y puede crear productos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--verboso", action="store_true", help="mostrar cada petición")
+    args = parser.parse_args(argv)
+
+    print("Generando cadena simulada...")
+    servidor = crear_servidor(
+        host=args.host, puerto=args.puerto, latencia=args.latencia, jitter=args.jitter,
+        tasa_error=args.tasa_error, verboso=args.verboso, semilla=args.semilla,
+        bloques=args.bloques, txs_por_bloque=args.txs_por_bloque,
+        fraccion_propias=args.fraccion_propias, productos=args.productos,
+        clave_demo=args.clave_demo, fundadora=args.fundadora,
+    )
+    url = f"http://{args.host}:{servidor.server_address[1]}"
+    print(f"Servidor simulado en {url}")
+    print(f"Wallet de prueba: {servidor.estado.wallet_demo} (clave privada {args.clave_demo})")
+    print("Para apuntar la app:")
+    print(f"    VELWALLET_NODE_URL={url} VELWALLET_MARKETPLACE_URL={url} python main.py")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -54,7 +54,7 @@ p4a.branch = master
 # ---------- Excludes ----------
 
 source.exclude_exts = spec
-source.exclude_dirs = tests,bin,.git,__pycache__
+source.exclude_dirs = tests,bin,.git,__pycache__,benchmarks
 
 
 # ---------- Kivy ----------
@@ -1,11 +1,12 @@
-import hashlib
-import requests
-import os
-import threading
-import secrets
-import json
 import time
-import webbrowser
+
+# Referencia para medir el arranque (ver TiemposArranque)
+INICIO_ARRANQUE = time.perf_counter()
+
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
@@ -15,171 +16,227 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
 from kivy.uix.scrollview import ScrollView
-from kivy.uix.image import Image
-from kivy.uix.widget import Widget
 from kivy.lang import Builder
-from kivy.storage.jsonstore import JsonStore
 from kivy.clock import Clock
 from kivy.metrics import dp
-from kivy.core.clipboard import Clipboard
 from kivy.factory import Factory
-from kivy.animation import Animation
 from kivy.uix.modalview import ModalView
-from kivy.graphics import Color, Rectangle
-from kivy.storage.jsonstore import JsonStore
-
-# --- CONFIGURACIÓN ---
-NODE_URL = "https://velcoin-vlc-l3uk.onrender.com"
-MARKETPLACE_URL = "https://marketplace-node.onrender.com"
-
-# WALLET FUNDADORA (solo esta puede agregar productos)
-WALLET_FUNDADORA = "421fe2ca5041d7fcc82f0abb96a7f03080c2e17c"
-
-# Sesión persistente para el marketplace (mantiene cookies de autenticación)
-marketplace_session = requests.Session()
-
-def sha256(msg):
-    if isinstance(msg, str):
-        msg = msg.encode()
-    return hashlib.sha256(msg).hexdigest()
-
-def derivar_wallet_oficial(priv_hex):
-    try:
-        private_key = priv_hex.lower()
-        public_key = sha256(private_key)
-        address = sha256(public_key)[:40]
-        return address, public_key, private_key
-    except Exception as e:
-        print(f"Error derivando wallet: {e}")
-        return None, None, None
-
-def firmar_transaccion_nodo(public_key, sender, destinatario, monto, nonce):
-    try:
-        payload = f'{sender}{destinatario}{monto}{nonce}'
-        pub_key_hash = sha256(public_key)
-        signature = sha256(pub_key_hash + payload)
-        return signature
-    except Exception as e:
-        print(f"Error en firma: {e}")
-        return None
-        
-def firmar_challenge(public_key, challenge):
-    try:
-        pub_key_hash = sha256(public_key)
-        signature = sha256(pub_key_hash + challenge)
-        return signature
-    except Exception as e:
-        print(f"Error firmando challenge: {e}")
-        return None
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.properties import StringProperty, ListProperty, ObjectProperty, BooleanProperty
 
-# === NUEVAS FUNCIONES PARA HASH DE TRANSACCIONES ===
+from velwallet_core import (
+    MARKETPLACE_URL,
+    WALLET_FUNDADORA,
+    derivar_wallet_oficial,
+    nueva_clave_privada,
+    construir_transaccion,
+    calcular_tx_hash_completo,
+    nodo,
+    pool_red,
+    pool_minado,
+    consultar_tx_en_nodo,
+    AlmacenCadena,
+    SincronizadorCadena,
+    SeguidorConfirmaciones,
+    cache_hashes,
+    cache_detalles_tx,
+    cache_estado_cuenta,
+    calcular_tx_hashes,
+    pedir_balance,
+    escanear_wallet,
+    estado_wallet,
+    gestor_auth,
+    cache_derechos,
+    almacen_compras,
+    catalogo,
+    pool_sondeos,
+    compra_desde_producto,
+    reconstruir_compras,
+    url_descarga_firmada,
+)
 
-def calcular_tx_hash_completo(tx):
+
+class Tarea:
+    """Tarea en segundo plano; el código que la corre consulta `cancelada` antes de tocar la UI."""
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self._cancelada = threading.Event()
+
+    def cancelar(self):
+        self._cancelada.set()
+
+    @property
+    def cancelada(self):
+        return self._cancelada.is_set()
+
+
+class GestorTareas:
     """
-    Calcula el hash canónico EXACTO como el nodo.
-    IMPORTANTE: El nodo excluye el campo 'hash' al calcular.
+    Pool acotado para las acciones de la UI. Hay como mucho una tarea en curso
+    por tipo: las peticiones que llegan mientras tanto se descartan o, con
+    repetir=True, se juntan en una sola pasada más al terminar la actual.
+    Una tarea cancelada sigue contando como en curso hasta que su hilo termina;
+    lo que se lance mientras tanto queda en espera detrás de ella.
     """
-    try:
-        # EXCLUIR siempre el campo 'hash' (igual que el nodo)
-        tx_limpio = {}
-        
-        for campo in sorted(tx.keys()):
-            if campo == 'hash':
-                continue
-            
-            valor = tx[campo]
-            
-            # Normalizar tipos exactamente como el nodo
-            if campo == 'amount':
-                tx_limpio[campo] = float(valor)
-            elif campo in ['nonce', 'timestamp', 'received_at']:
-                tx_limpio[campo] = int(valor) if valor else 0
-            else:
-                tx_limpio[campo] = str(valor) if valor else ""
-        
-        # JSON con separadores EXACTOS de Python por defecto
-        json_str = json.dumps(tx_limpio, sort_keys=True, separators=(', ', ': '))
-        return sha256(json_str)
-        
-    except Exception as e:
-        print(f"Error calculando hash: {e}")
-        return tx.get('hash', 'ERROR')
-        
-def calcular_tx_hash_corto(tx_hash_completo):
-    """Versión corta para mostrar (primeros 16 caracteres)"""
-    return tx_hash_completo[:16] if tx_hash_completo else 'N/A'
 
+    def __init__(self, max_workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarea")
+        self.activas = {}
+        self.en_espera = {}
+        self.lock = threading.Lock()
+
+    def lanzar(self, tipo, fn, *args, repetir=False):
+        """Corre fn(tarea, *args). Devuelve la Tarea, o None si se juntó con una en curso."""
+        with self.lock:
+            activa = self.activas.get(tipo)
+            if activa is not None:
+                if activa.cancelada:
+                    # Reabrir tras cancelar: corre apenas termine la cancelada
+                    tarea = Tarea(tipo)
+                    self.en_espera[tipo] = (tarea, fn, args)
+                    return tarea
+                if repetir:
+                    # Solo cuenta la última petición
+                    self.en_espera[tipo] = (Tarea(tipo), fn, args)
+                return None
+            tarea = Tarea(tipo)
+            self.activas[tipo] = tarea
+        self.pool.submit(self._correr, tarea, fn, args)
+        return tarea
+
+    def cancelar(self, tipo):
+        """Cancela la tarea en curso de ese tipo (p. ej. al cerrar su popup) y la que esperaba."""
+        with self.lock:
+            tarea = self.activas.get(tipo)
+            self.en_espera.pop(tipo, None)
+        if tarea:
+            tarea.cancelar()
+
+    def _correr(self, tarea, fn, args):
+        try:
+            fn(tarea, *args)
+        except Exception as e:
+            print(f"Error en tarea {tarea.tipo}: {e}")
+        finally:
+            with self.lock:
+                del self.activas[tarea.tipo]
+                siguiente = self.en_espera.pop(tarea.tipo, None)
+                if siguiente:
+                    self.activas[tarea.tipo] = siguiente[0]
+            if siguiente:
+                self.pool.submit(self._correr, *siguiente)
+
+
+gestor_tareas = GestorTareas()
 
-def consultar_tx_en_nodo(tx_hash):
+class CronometroEtapas:
     """
-    Consulta una transacción específica al nodo para obtener datos oficiales.
+    Mide cuánto tarda cada etapa de un flujo (p. ej. una compra) para ver
+    dónde se va la latencia. Las etapas pueden medirse desde varios hilos.
     """
-    try:
-        url = f"{NODE_URL}/tx/{tx_hash}"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        print(f"Error consultando TX al nodo: {e}")
-        return None
 
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.inicio = time.perf_counter()
+        self.etapas = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nombre):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.etapas[nombre] = round(time.perf_counter() - t0, 3)
 
-# === FIN NUEVAS FUNCIONES ===
+    def resumen(self):
+        with self.lock:
+            resumen = dict(self.etapas)
+        resumen["total"] = round(time.perf_counter() - self.inicio, 3)
+        return resumen
 
-def autenticar_en_marketplace(wallet, pub_key):
+    def reportar(self):
+        resumen = self.resumen()
+        detalle = ", ".join(f"{k}={v:.3f}s" for k, v in resumen.items())
+        print(f"Tiempos de {self.nombre}: {detalle}")
+        return resumen
+
+
+class TiemposArranque:
     """
-    Autentica al usuario en el marketplace y devuelve True si tuvo éxito.
-    Usa la sesión global para mantener las cookies.
+    Segundos desde que empezó a cargarse main.py hasta cada hito del arranque
+    (carga del módulo, KV, build, primer frame). Si VELWALLET_TIEMPOS_ARRANQUE apunta a
+    un archivo, el resultado se guarda ahí en JSON para seguir regresiones.
     """
-    try:
-        # 1. Solicitar challenge
-        r_challenge = marketplace_session.post(
-            f"{MARKETPLACE_URL}/auth/challenge",
-            json={"wallet": wallet},
-            timeout=10
-        )
-        
-        if r_challenge.status_code != 200:
-            print(f"Error obteniendo challenge: {r_challenge.status_code}")
-            return False
-        
-        challenge = r_challenge.json().get('challenge')
-        if not challenge:
-            print("No se recibió challenge")
-            return False
-        
-        # 2. Firmar challenge
-        signature = firmar_challenge(pub_key, challenge)
-        if not signature:
-            print("Error firmando challenge")
-            return False
-        
-        # 3. Verificar firma
-        r_verify = marketplace_session.post(
-            f"{MARKETPLACE_URL}/auth/verify",
-            json={
-                "wallet": wallet,
-                "public_key": pub_key,
-                "signature": signature
-            },
-            timeout=10
-        )
-        
-        if r_verify.status_code == 200:
-            print(f"Autenticación exitosa para {wallet[:16]}...")
-            return True
-        else:
-            print(f"Verificación fallida: {r_verify.status_code} - {r_verify.text}")
-            return False
-            
-    except Exception as e:
-        print(f"Error en autenticación: {e}")
-        return False
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.marcas = {}
+
+    def marcar(self, nombre):
+        self.marcas[nombre] = round(time.perf_counter() - self.inicio, 3)
+
+    def reportar(self):
+        import json
+        import os
+
+        detalle = ", ".join(f"{k}={v:.3f}s" for k, v in self.marcas.items())
+        print(f"Tiempos de arranque: {detalle}")
+        ruta = os.environ.get("VELWALLET_TIEMPOS_ARRANQUE")
+        if ruta:
+            with open(ruta, 'w') as f:
+                json.dump(self.marcas, f)
+        return dict(self.marcas)
+
+
+class DespachadorUI:
+    """
+    Cola de actualizaciones de la UI publicadas desde los hilos de trabajo.
+    Todo lo que llega durante un frame se aplica junto en un solo callback de
+    Clock; las entradas con la misma clave se reemplazan y solo corre la última
+    (p. ej. varios cambios seguidos del popup de carga).
+    """
+
+    def __init__(self):
+        self.cola = OrderedDict()
+        self.contador = 0
+        self.programado = False
+        self.lock = threading.Lock()
+
+    def publicar(self, fn, clave=None):
+        with self.lock:
+            if clave is None:
+                self.contador += 1
+                clave = ("_", self.contador)
+            else:
+                # La entrada reemplazada pasa al final para respetar el orden de llegada
+                self.cola.pop(clave, None)
+            self.cola[clave] = fn
+            if self.programado:
+                return
+            self.programado = True
+        Clock.schedule_once(self._aplicar)
+
+    def _aplicar(self, dt):
+        with self.lock:
+            cola, self.cola = self.cola, OrderedDict()
+            self.programado = False
+        for fn in cola.values():
+            try:
+                fn()
+            except Exception as e:
+                print(f"Error actualizando la UI: {e}")
+
+
+despachador_ui = DespachadorUI()
+
 
 # --- DISEÑO KV ---
+# Reglas de las pantallas de login y principal: se cargan al arrancar
 KV = """
-<TransactionItem@BoxLayout>:
+<TransactionItem>:
     orientation: 'horizontal'
     size_hint_y: None
     height: dp(55)
@@ -196,114 +253,20 @@ KV = """
         orientation: 'vertical'
         Label:
             id: tipo_monto
-            text: "0.00 VLC"
+            text: root.texto_monto
+            color: root.color_monto
             bold: True
             halign: 'left'
             text_size: self.size
             font_size: '14sp'
         Label:
             id: addr_hist
-            text: "Dirección..."
+            text: root.texto_detalle
             font_size: '10sp'
             color: (0.6, 0.6, 0.6, 1)
             halign: 'left'
             text_size: self.size
 
-<ProductItem@BoxLayout>:
-    orientation: 'vertical'
-    size_hint_y: None
-    height: dp(120)
-    padding: [dp(15), dp(10)]
-    spacing: dp(8)
-    canvas.before:
-        Color:
-            rgba: (0.12, 0.13, 0.18, 1)
-        RoundedRectangle:
-            pos: self.pos
-            size: self.size
-            radius: [dp(12)]
-    
-    Label:
-        id: prod_title
-        text: "Título"
-        font_size: '16sp'
-        bold: True
-        halign: 'left'
-        text_size: self.size
-        color: (1, 1, 1, 1)
-    
-    Label:
-        id: prod_price
-        text: "0 VLC"
-        font_size: '14sp'
-        halign: 'left'
-        text_size: self.size
-        color: (0.4, 0.8, 1, 1)
-    
-    Label:
-        id: prod_desc
-        text: "Descripción..."
-        font_size: '11sp'
-        halign: 'left'
-        text_size: self.size
-        color: (0.7, 0.7, 0.7, 1)
-        size_hint_y: None
-        height: dp(30)
-    
-    Button:
-        id: btn_buy
-        text: "COMPRAR"
-        size_hint_y: None
-        height: dp(35)
-        background_color: (0.1, 0.45, 1, 1)
-        font_size: '12sp'
-
-<PurchaseItem@BoxLayout>:
-    orientation: 'vertical'
-    size_hint_y: None
-    height: dp(100)
-    padding: [dp(15), dp(10)]
-    spacing: dp(5)
-    canvas.before:
-        Color:
-            rgba: (0.15, 0.18, 0.25, 1)
-        RoundedRectangle:
-            pos: self.pos
-            size: self.size
-            radius: [dp(12)]
-    
-    Label:
-        id: purchase_title
-        text: "Producto"
-        font_size: '16sp'
-        bold: True
-        halign: 'left'
-        text_size: self.size
-        color: (1, 1, 1, 1)
-    
-    Label:
-        id: purchase_status
-        text: "Estado: Completado"
-        font_size: '12sp'
-        halign: 'left'
-        text_size: self.size
-        color: (0.4, 1, 0.4, 1)
-    
-    BoxLayout:
-        size_hint_y: None
-        height: dp(35)
-        spacing: dp(10)
-        Button:
-            id: btn_download
-            text: "DESCARGAR"
-            background_color: (0.2, 0.8, 0.4, 1)
-            font_size: '12sp'
-        Button:
-            id: btn_details
-            text: "DETALLES"
-            background_color: (0.1, 0.12, 0.2, 1)
-            font_size: '12sp'
-
 <MenuButton@Button>:
     size_hint: None, None
     size: dp(50), dp(40)
@@ -369,6 +332,7 @@ KV = """
                     radius: [dp(25)]
             
             Label:
+                id: balance_estado
                 text: "Balance disponible"
                 font_size: '13sp'
                 color: (1, 1, 1, 0.7)
@@ -455,10 +419,13 @@ KV = """
                     color: (0.1, 0.45, 1, 1)
                     on_release: root.refrescar_y_minar()
 
-            ScrollView:
-                BoxLayout:
-                    id: history_list
+            RecycleView:
+                id: history_list
+                viewclass: 'TransactionItem'
+                RecycleBoxLayout:
                     orientation: 'vertical'
+                    default_size: None, dp(55)
+                    default_size_hint: 1, None
                     size_hint_y: None
                     height: self.minimum_height
                     spacing: dp(5)
@@ -519,6 +486,218 @@ KV = """
         Widget:
 """
 
+# Plantillas del marketplace y de Mis Compras: la mayoría de las sesiones no
+# las abre, así que se compilan recién en el primer uso (ver cargar_kv_marketplace)
+KV_MARKETPLACE = """
+<ProductItem>:
+    orientation: 'vertical'
+    size_hint_y: None
+    height: dp(120)
+    padding: [dp(15), dp(10)]
+    spacing: dp(8)
+    canvas.before:
+        Color:
+            rgba: (0.12, 0.13, 0.18, 1)
+        RoundedRectangle:
+            pos: self.pos
+            size: self.size
+            radius: [dp(12)]
+    
+    Label:
+        id: prod_title
+        text: root.titulo
+        font_size: '16sp'
+        bold: True
+        halign: 'left'
+        text_size: self.size
+        color: (1, 1, 1, 1)
+    
+    Label:
+        id: prod_price
+        text: root.precio
+        font_size: '14sp'
+        halign: 'left'
+        text_size: self.size
+        color: (0.4, 0.8, 1, 1)
+    
+    Label:
+        id: prod_desc
+        text: root.descripcion
+        font_size: '11sp'
+        halign: 'left'
+        text_size: self.size
+        color: (0.7, 0.7, 0.7, 1)
+        size_hint_y: None
+        height: dp(30)
+    
+    Button:
+        id: btn_buy
+        text: "COMPRAR"
+        size_hint_y: None
+        height: dp(35)
+        background_color: (0.1, 0.45, 1, 1)
+        font_size: '12sp'
+        on_release: root.comprar()
+
+<PurchaseItem@BoxLayout>:
+    orientation: 'vertical'
+    size_hint_y: None
+    height: dp(100)
+    padding: [dp(15), dp(10)]
+    spacing: dp(5)
+    canvas.before:
+        Color:
+            rgba: (0.15, 0.18, 0.25, 1)
+        RoundedRectangle:
+            pos: self.pos
+            size: self.size
+            radius: [dp(12)]
+    
+    Label:
+        id: purchase_title
+        text: "Producto"
+        font_size: '16sp'
+        bold: True
+        halign: 'left'
+        text_size: self.size
+        color: (1, 1, 1, 1)
+    
+    Label:
+        id: purchase_status
+        text: "Estado: Completado"
+        font_size: '12sp'
+        halign: 'left'
+        text_size: self.size
+        color: (0.4, 1, 0.4, 1)
+    
+    BoxLayout:
+        size_hint_y: None
+        height: dp(35)
+        spacing: dp(10)
+        Button:
+            id: btn_download
+            text: "DESCARGAR"
+            background_color: (0.2, 0.8, 0.4, 1)
+            font_size: '12sp'
+        Button:
+            id: btn_details
+            text: "DETALLES"
+            background_color: (0.1, 0.12, 0.2, 1)
+            font_size: '12sp'
+"""
+
+_kv_marketplace_cargado = False
+
+
+def cargar_kv_marketplace():
+    global _kv_marketplace_cargado
+    if not _kv_marketplace_cargado:
+        Builder.load_string(KV_MARKETPLACE)
+        _kv_marketplace_cargado = True
+
+
+def fila_historial(tx, my_addr):
+    """Datos de una fila del historial para el RecycleView (ver TransactionItem)."""
+    es_envio = tx['remitente'] == my_addr
+    monto_formateado = f"{float(tx['monto']):,.2f}"
+    return {
+        # Mostrar hash corto en la lista
+        "texto_monto": f"{'-' if es_envio else '+'} {monto_formateado} VLC",
+        "color_monto": (1, 0.4, 0.4, 1) if es_envio else (0.4, 1, 0.4, 1),
+        "texto_detalle": f"{tx['tx_hash_corto']}... | {'Para: ' if es_envio else 'De: '}{tx['destinatario' if es_envio else 'remitente'][:12]}...",
+        # Guardar datos completos para el popup
+        "tx_data": tx,
+        "es_envio": es_envio
+    }
+
+
+def _clave_fila(fila):
+    return fila["tx_data"]["tx_hash_completo"]
+
+
+def _estado_fila(fila):
+    tx = fila["tx_data"]
+    return (fila["texto_monto"], fila["texto_detalle"], tx.get('status'),
+            tx.get('block_index'), tx.get('block_hash'))
+
+
+def calcular_diff_historial(anterior, nuevo):
+    """
+    Compara dos listas de filas del historial usando tx_hash_completo como clave.
+    Devuelve (eliminados, insertados, actualizados) o None si las filas que se
+    conservan cambiaron de orden y conviene reemplazar la lista completa:
+      - eliminados: índices en `anterior`, de mayor a menor
+      - insertados: (índice en `nuevo`, fila), de menor a mayor
+      - actualizados: (índice en `nuevo`, fila) cuyo estado cambió (pendiente -> confirmada)
+    Aplicados en ese orden sobre `anterior` dan como resultado `nuevo`.
+    """
+    previas = {_clave_fila(f): f for f in anterior}
+    indices_nuevos = {_clave_fila(f): i for i, f in enumerate(nuevo)}
+    if len(previas) != len(anterior) or len(indices_nuevos) != len(nuevo):
+        # Claves repetidas: no se puede hacer un diff fiable
+        return None
+
+    conservadas = [_clave_fila(f) for f in anterior if _clave_fila(f) in indices_nuevos]
+    if conservadas != [_clave_fila(f) for f in nuevo if _clave_fila(f) in previas]:
+        return None
+
+    eliminados = [
+        i for i in range(len(anterior) - 1, -1, -1)
+        if _clave_fila(anterior[i]) not in indices_nuevos
+    ]
+    insertados = []
+    actualizados = []
+    for i, fila in enumerate(nuevo):
+        previa = previas.get(_clave_fila(fila))
+        if previa is None:
+            insertados.append((i, fila))
+        elif _estado_fila(previa) != _estado_fila(fila):
+            actualizados.append((i, fila))
+    return eliminados, insertados, actualizados
+
+
+class TransactionItem(RecycleDataViewBehavior, BoxLayout):
+    """Fila reciclable del historial; el RecycleView le asigna los datos al hacer scroll."""
+    texto_monto = StringProperty("0.00 VLC")
+    color_monto = ListProperty([1, 1, 1, 1])
+    texto_detalle = StringProperty("Dirección...")
+    tx_data = ObjectProperty(None, allownone=True)
+    es_envio = BooleanProperty(False)
+
+    def on_touch_down(self, touch):
+        if self.tx_data is not None and self.collide_point(*touch.pos):
+            pantalla = App.get_running_app().root.get_screen('main')
+            pantalla.mostrar_detalle_tx(self.tx_data, self.es_envio)
+        return super().on_touch_down(touch)
+
+
+# Productos que se renderizan por página en el marketplace
+TAMANO_PAGINA_CATALOGO = 20
+
+
+def fila_producto(prod):
+    """Datos de una fila del marketplace para el RecycleView (ver ProductItem)."""
+    return {
+        "titulo": prod.get('title', 'Sin título'),
+        "precio": f"{prod.get('price', 0)} VLC",
+        "descripcion": prod.get('description', '')[:50] + '...',
+        "producto": prod
+    }
+
+
+class ProductItem(RecycleDataViewBehavior, BoxLayout):
+    """Fila reciclable del catálogo del marketplace."""
+    titulo = StringProperty("Título")
+    precio = StringProperty("0 VLC")
+    descripcion = StringProperty("Descripción...")
+    producto = ObjectProperty(None, allownone=True)
+
+    def comprar(self):
+        if self.producto is not None:
+            pantalla = App.get_running_app().root.get_screen('main')
+            pantalla.comprar_producto(self.producto)
+
+
 class MenuLateral(ModalView):
     def __init__(self, main_screen, **kwargs):
         super().__init__(**kwargs)
@@ -531,6 +710,10 @@ class MenuLateral(ModalView):
         self.build_menu()
     
     def build_menu(self):
+        # El menú se construye la primera vez que se abre
+        from kivy.graphics import Color, Rectangle
+        from kivy.uix.widget import Widget
+        
         layout = BoxLayout(orientation='vertical', size_hint=(1, 1))
         
         with layout.canvas.before:
@@ -595,9 +778,11 @@ class MenuLateral(ModalView):
         self.header_rect.size = instance.size
     
     def on_open(self):
+        from kivy.animation import Animation
         Animation(pos_hint={'x': 0}, duration=0.3, transition='out_cubic').start(self)
     
     def dismiss(self, *args):
+        from kivy.animation import Animation
         anim = Animation(pos_hint={'x': -1}, duration=0.25, transition='in_cubic')
         anim.bind(on_complete=lambda *x: super(MenuLateral, self).dismiss())
         anim.start(self)
@@ -634,163 +819,187 @@ class MainScreen(Screen):
     menu_lateral = None
     popup_marketplace = None
     popup_mis_compras = None
+    purchases_vacio = None
+    products_vacio = None
+    productos_mostrados = None
+    productos_renderizados = 0
     
-    # Cache de compras para evitar perderlas entre sesiones
-    mis_compras_cache = []
+    # Duración de cada etapa de la última compra (ver CronometroEtapas)
+    ultimos_tiempos_compra = None
+    
+    seguidor_confirmaciones = None
+    
+    # Sincronizador incremental de la wallet activa (compartido por refresco, compras e historial)
+    sincronizador = None
+    lock_sincronizador = threading.Lock()
     
     def on_enter(self):
+        # Lo último conocido se pinta en este mismo frame; el refresco lo reemplaza al llegar
+        if estado_wallet.existe and not self.ids.history_list.data:
+            self.mostrar_estado_guardado(estado_wallet.address)
         self.actualizar_todo()
 
+    def mostrar_estado_guardado(self, addr):
+        guardado = cache_estado_cuenta.obtener(addr)
+        if not guardado:
+            return
+        if guardado.get('balance') is not None:
+            altura = guardado.get('altura')
+            marca = f"bloque #{altura}" if altura is not None and altura >= 0 else "sin sincronizar"
+            self.mostrar_balance(guardado['balance'], f"{marca}, actualizando...")
+        if guardado.get('historial'):
+            self.refresh_ui(guardado['historial'])
+
+    def obtener_sincronizador(self, addr):
+        with self.lock_sincronizador:
+            if not self.es_wallet_actual(addr):
+                # Tarea que sigue en vuelo tras cerrar sesión: sincroniza sin volver a escribir vlc_chain.json
+                sincronizador = SincronizadorCadena(addr)
+                sincronizador.descartar()
+                return sincronizador
+            if self.sincronizador is None or self.sincronizador.address != addr:
+                self.sincronizador = SincronizadorCadena(addr)
+            return self.sincronizador
+
     def actualizar_todo(self):
-        store = JsonStore('vlc_secure.json')
-        if store.exists('user'):
-            addr = store.get('user')['address']
+        if estado_wallet.existe:
+            addr = estado_wallet.address
             self.ids.wallet_addr_short.text = f"{addr[:15]}..."
-            threading.Thread(target=self.update_info, args=(addr,), daemon=True).start()
+            # Un solo refresco en curso; los toques seguidos se juntan en una pasada más
+            gestor_tareas.lanzar("refresco", lambda tarea: self.update_info(addr, tarea), repetir=True)
+
+    def es_wallet_actual(self, addr):
+        """False si se cerró sesión (o cambió la wallet) desde que empezó un refresco de `addr`."""
+        usuario = estado_wallet.usuario
+        return usuario is not None and usuario['address'] == addr
 
     # === FUNCIÓN MODIFICADA ===
-    def update_info(self, addr):
+    def update_info(self, addr, tarea):
+        # El balance se muestra apenas llega; historial y mempool, al terminar la sincronización.
+        # Solo se descargan y procesan los bloques nuevos desde la última sincronización
+        generacion = cache_estado_cuenta.generacion
+        futuro_balance = pedir_balance(addr)
+        futuro_balance.add_done_callback(lambda f: self._balance_recibido(f, addr, generacion))
+
         try:
-            r_bal = requests.get(f"{NODE_URL}/balance/{addr}", timeout=10).json()
-            balance = r_bal.get('balance', 0)
-
-            r_blocks = requests.get(f"{NODE_URL}/blocks", timeout=10).json()
-            mis_txs = []
-            for bloque in r_blocks:
-                txs = bloque.get('transactions', [])
-                block_hash = bloque.get('block_hash', '')
-                block_index = bloque.get('index', 0)
-                timestamp = bloque.get('timestamp', 0)
-                
-                for tx in txs:
-                    if tx.get('from') == addr or tx.get('to') == addr:
-                        # Usar hash del nodo si está disponible, sino calcular
-                        tx_hash_nodo = tx.get('hash')
-                        if not tx_hash_nodo:
-                            tx_sin_hash = {k: v for k, v in tx.items() if k != 'hash'}
-                            tx_hash_nodo = calcular_tx_hash_completo(tx_sin_hash)
-                        
-                        mis_txs.append({
-                            "remitente": tx.get('from'),
-                            "destinatario": tx.get('to'),
-                            "monto": tx.get('amount'),
-                            "nonce": tx.get('nonce'),
-                            "public_key": tx.get('public_key'),
-                            "signature": tx.get('signature'),
-                            "timestamp": timestamp,
-                            "block_index": block_index,
-                            "block_hash": block_hash,
-                            "tx_hash_completo": tx_hash_nodo,
-                            "tx_hash_corto": calcular_tx_hash_corto(tx_hash_nodo)
-                        })
-            
-            # También buscar en mempool
-            try:
-                r_mempool = requests.get(f"{NODE_URL}/mempool", timeout=10).json()
-                for tx in r_mempool:
-                    if tx.get('from') == addr or tx.get('to') == addr:
-                        tx_hash_nodo = tx.get('hash')
-                        if not tx_hash_nodo:
-                            tx_sin_hash = {k: v for k, v in tx.items() if k != 'hash'}
-                            tx_hash_nodo = calcular_tx_hash_completo(tx_sin_hash)
-                        
-                        mis_txs.append({
-                            "remitente": tx.get('from'),
-                            "destinatario": tx.get('to'),
-                            "monto": tx.get('amount'),
-                            "nonce": tx.get('nonce'),
-                            "public_key": tx.get('public_key'),
-                            "signature": tx.get('signature'),
-                            "timestamp": tx.get('timestamp', int(time.time())),
-                            "block_index": None,
-                            "block_hash": None,
-                            "tx_hash_completo": tx_hash_nodo,
-                            "tx_hash_corto": calcular_tx_hash_corto(tx_hash_nodo),
-                            "status": "pending"
-                        })
-            except Exception as e:
-                print(f"Error cargando mempool: {e}")
+            escaneo = escanear_wallet(addr, self.obtener_sincronizador(addr), futuro_balance=futuro_balance)
+            mis_txs = escaneo["historial"]
+            if tarea.cancelada or not self.es_wallet_actual(addr):
+                # Se cerró sesión durante el refresco: no se guarda ni se muestra nada
+                return
+            if self.seguidor_confirmaciones:
+                self.seguidor_confirmaciones.marcar_confirmadas(
+                    tx['tx_hash_completo'] for tx in mis_txs if tx.get('status') != 'pending'
+                )
             
-            mis_txs.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-            Clock.schedule_once(lambda dt: self.refresh_ui(balance, mis_txs))
+            cache_estado_cuenta.guardar(addr, generacion, historial=mis_txs, altura=escaneo["altura"])
+            despachador_ui.publicar(lambda: self.refresh_ui(mis_txs), "historial")
             
         except Exception as e:
             print(f"Error en update_info: {e}")
-            Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "No se pudo conectar al nodo"))
+            # Si el balance también falló, su callback ya avisó al usuario
+            if not tarea.cancelada and futuro_balance.exception() is None:
+                despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "No se pudo conectar al nodo"), "error_nodo")
 
-    # === FUNCIÓN MODIFICADA ===
-    def refresh_ui(self, bal, history):
+    def _balance_recibido(self, futuro, addr, generacion):
+        if not self.es_wallet_actual(addr):
+            return
+        try:
+            balance = futuro.result()
+        except Exception as e:
+            print(f"Error obteniendo balance: {e}")
+            despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "No se pudo conectar al nodo"), "error_nodo")
+            return
+        cache_estado_cuenta.guardar(addr, generacion, balance=balance)
+        # El balance se muestra apenas llega, sin esperar al historial
+        despachador_ui.publicar(lambda: self.mostrar_balance(balance), "balance")
+
+    def restablecer_balance(self):
+        """Deja el balance como al abrir la pantalla, sin datos de ninguna wallet."""
+        self.ids.balance_main.text = "Cargando..."
+        self.ids.balance_main.opacity = 1
+        self.ids.balance_estado.text = "Balance disponible"
+
+    def mostrar_balance(self, bal, desactualizado=None):
+        """`desactualizado` describe de cuándo es un balance guardado; None si viene del nodo."""
         self.ids.balance_main.text = f"{bal:,.2f} VLC"
-        self.ids.history_list.clear_widgets()
-        store = JsonStore('vlc_secure.json')
-        my_addr = store.get('user')['address']
-
-        for tx in history:
-            item = Factory.TransactionItem()
-            es_envio = tx['remitente'] == my_addr
-            monto_formateado = f"{float(tx['monto']):,.2f}"
-            
-            # Mostrar hash corto en la lista
-            item.ids.tipo_monto.text = f"{'-' if es_envio else '+'} {monto_formateado} VLC"
-            item.ids.tipo_monto.color = (1, 0.4, 0.4, 1) if es_envio else (0.4, 1, 0.4, 1)
-            item.ids.addr_hist.text = f"{tx['tx_hash_corto']}... | {'Para: ' if es_envio else 'De: '}{tx['destinatario' if es_envio else 'remitente'][:12]}..."
-            
-            # Guardar datos completos para el popup
-            item.tx_data = tx
-            item.es_envio = es_envio
-            
-            # Bind para mostrar detalle
-            item.bind(on_touch_down=lambda inst, touch, t=tx, e=es_envio: 
-                      self.mostrar_detalle_tx(t, e) if inst.collide_point(*touch.pos) else None)
-            
-            self.ids.history_list.add_widget(item)
+        if desactualizado:
+            self.ids.balance_estado.text = f"Balance disponible ({desactualizado})"
+            self.ids.balance_main.opacity = 0.6
+        else:
+            self.ids.balance_estado.text = "Balance disponible"
+            self.ids.balance_main.opacity = 1
+
+    # === FUNCIÓN MODIFICADA ===
+    def refresh_ui(self, history):
+        my_addr = estado_wallet.address
+
+        # El RecycleView solo instancia las filas visibles y las reutiliza al hacer scroll
+        filas = [fila_historial(tx, my_addr) for tx in history]
+        datos = self.ids.history_list.data
+
+        diff = calcular_diff_historial(datos, filas) if datos else None
+        if diff is None:
+            self.ids.history_list.data = filas
+            return
+
+        # Solo se tocan las filas nuevas, eliminadas o que cambiaron de estado
+        eliminados, insertados, actualizados = diff
+        for i in eliminados:
+            del datos[i]
+        for i, fila in insertados:
+            datos.insert(i, fila)
+        for i, fila in actualizados:
+            datos[i] = fila
 
     # === FUNCIÓN MODIFICADA - CONSULTA AL NODO ===
-    def mostrar_detalle_tx(self, tx, es_envio):
-        from datetime import datetime
-        import webbrowser
-        
-        # Obtener hash de la transacción
+    def campos_detalle_tx(self, tx, datos_nodo=None):
+        """Campos a mostrar en el detalle: datos del nodo si existen, sino los locales."""
         tx_hash_completo = tx.get('tx_hash_completo') or tx.get('tx_hash')
         
-        # PRIMERO: Intentar consultar al nodo para datos oficiales
-        datos_nodo = None
-        if tx_hash_completo:
-            datos_nodo = consultar_tx_en_nodo(tx_hash_completo)
-        
-        # USAR datos del nodo si están disponibles, sino usar datos locales
         if datos_nodo:
             # Usar datos oficiales del nodo
-            tx_hash_mostrar = datos_nodo.get('tx_hash', tx_hash_completo)
-            tx_from = datos_nodo.get('from', tx.get('remitente', 'N/A'))
-            tx_to = datos_nodo.get('to', tx.get('destinatario', 'N/A'))
-            tx_amount = datos_nodo.get('amount', tx.get('monto', 0))
-            tx_nonce = datos_nodo.get('nonce', tx.get('nonce', 'N/A'))
             tx_block = datos_nodo.get('block_index')
-            tx_block_hash = datos_nodo.get('block_hash')
             tx_confirmations = datos_nodo.get('confirmations', 0)
-            tx_status = datos_nodo.get('status', 'unknown')
-            tx_timestamp = datos_nodo.get('timestamp', tx.get('timestamp', 0))
-        else:
-            # Fallback: usar datos locales
-            tx_hash_mostrar = tx_hash_completo
-            tx_from = tx.get('remitente', tx.get('from', 'N/A'))
-            tx_to = tx.get('destinatario', tx.get('to', 'N/A'))
-            tx_amount = tx.get('monto', tx.get('amount', 0))
-            tx_nonce = tx.get('nonce', 'N/A')
-            tx_block = tx.get('block_index')
-            tx_block_hash = tx.get('block_hash')
-            tx_confirmations = 0 if tx_block is None else 1
-            tx_status = tx.get('status', 'pending' if tx_block is None else 'confirmed')
-            tx_timestamp = tx.get('timestamp', 0)
+            # Los detalles cacheados pueden ser antiguos: recalcular confirmaciones con la altura local
+            if tx_block is not None and self.sincronizador and self.sincronizador.altura >= tx_block:
+                tx_confirmations = max(tx_confirmations, self.sincronizador.altura - tx_block + 1)
+            return {
+                "hash": datos_nodo.get('tx_hash', tx_hash_completo),
+                "from": datos_nodo.get('from', tx.get('remitente', 'N/A')),
+                "to": datos_nodo.get('to', tx.get('destinatario', 'N/A')),
+                "amount": datos_nodo.get('amount', tx.get('monto', 0)),
+                "nonce": datos_nodo.get('nonce', tx.get('nonce', 'N/A')),
+                "block": tx_block,
+                "block_hash": datos_nodo.get('block_hash'),
+                "confirmations": tx_confirmations,
+                "status": datos_nodo.get('status', 'unknown'),
+                "timestamp": datos_nodo.get('timestamp', tx.get('timestamp', 0))
+            }
         
-        # Construir el popup con los datos
-        layout = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(10))
+        # Fallback: usar datos locales
+        tx_block = tx.get('block_index')
+        return {
+            "hash": tx_hash_completo,
+            "from": tx.get('remitente', tx.get('from', 'N/A')),
+            "to": tx.get('destinatario', tx.get('to', 'N/A')),
+            "amount": tx.get('monto', tx.get('amount', 0)),
+            "nonce": tx.get('nonce', 'N/A'),
+            "block": tx_block,
+            "block_hash": tx.get('block_hash'),
+            "confirmations": 0 if tx_block is None else 1,
+            "status": tx.get('status', 'pending' if tx_block is None else 'confirmed'),
+            "timestamp": tx.get('timestamp', 0)
+        }
+
+    def texto_detalle_tx(self, campos, es_envio):
+        from datetime import datetime
         
         tipo = "ENVIADO" if es_envio else "RECIBIDO"
-        estado_texto = "✅ CONFIRMADO" if tx_status == 'confirmed' else "⏳ PENDIENTE"
+        estado_texto = "✅ CONFIRMADO" if campos['status'] == 'confirmed' else "⏳ PENDIENTE"
         
         # Formatear timestamp
+        tx_timestamp = campos['timestamp']
         try:
             if isinstance(tx_timestamp, (int, float)) and tx_timestamp > 0:
                 fecha = datetime.fromtimestamp(tx_timestamp).strftime('%Y-%m-%d %H:%M:%S')
@@ -802,34 +1011,49 @@ class MainScreen(Screen):
         # Contenido del popup
         contenido = f"""[b]Tipo:[/b] {tipo}
 [b]Estado:[/b] {estado_texto}
-[b]Monto:[/b] {float(tx_amount):.2f} VLC
+[b]Monto:[/b] {float(campos['amount']):.2f} VLC
 
 [b]Hash Transacción:[/b]
-{tx_hash_mostrar}
+{campos['hash']}
 
 [b]De:[/b]
-{tx_from}
+{campos['from']}
 
 [b]Para:[/b]
-{tx_to}
+{campos['to']}
 
-[b]Nonce:[/b] {tx_nonce}
+[b]Nonce:[/b] {campos['nonce']}
 [b]Timestamp:[/b] {fecha}
 """
         
         # Añadir datos de bloque si existen
-        if tx_block is not None:
+        if campos['block'] is not None:
             contenido += f"""
-[b]Bloque:[/b] #{tx_block}
-[b]Confirmaciones:[/b] {tx_confirmations}
+[b]Bloque:[/b] #{campos['block']}
+[b]Confirmaciones:[/b] {campos['confirmations']}
 """
-            if tx_block_hash:
-                contenido += f"[b]Block Hash:[/b]\n{tx_block_hash}\n"
+            if campos['block_hash']:
+                contenido += f"[b]Block Hash:[/b]\n{campos['block_hash']}\n"
+        return contenido
+
+    def mostrar_detalle_tx(self, tx, es_envio):
+        import webbrowser
+        
+        # Obtener hash de la transacción
+        tx_hash_completo = tx.get('tx_hash_completo') or tx.get('tx_hash')
+        
+        # El popup se abre al instante con los datos locales (o los del nodo ya cacheados);
+        # la consulta al nodo se hace en segundo plano y actualiza el popup al llegar
+        datos_nodo = cache_detalles_tx.obtener(tx_hash_completo) if tx_hash_completo else None
+        campos = self.campos_detalle_tx(tx, datos_nodo)
+        
+        # Construir el popup con los datos
+        layout = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(10))
         
         # Scroll con el contenido
         scroll = ScrollView(size_hint=(1, 1))
         label = Label(
-            text=contenido, 
+            text=self.texto_detalle_tx(campos, es_envio), 
             markup=True, 
             font_size='12sp', 
             halign='left', 
@@ -868,20 +1092,21 @@ class MainScreen(Screen):
         layout.add_widget(box_botones)
         
         pop = Popup(
-            title=f"Tx: {tx_hash_mostrar[:16]}...", 
+            title=f"Tx: {campos['hash'][:16]}...", 
             content=layout, 
             size_hint=(0.95, 0.85)
         )
         
         def abrir_explorer(instance):
             # Abrir la transacción específica en el explorer
-            url = f"{NODE_URL}/explorer/tx/{tx_hash_mostrar}"
+            url = nodo.url(f"/explorer/tx/{campos['hash']}")
             print(f"Abriendo explorer: {url}")
             webbrowser.open(url)
             self.mostrar_notificacion("Explorador", "Abriendo transacción en explorer")
         
         def copiar_hash(instance):
-            Clipboard.copy(tx_hash_mostrar)
+            from kivy.core.clipboard import Clipboard
+            Clipboard.copy(campos['hash'])
             notif = Popup(
                 title="Copiado", 
                 content=Label(text="Hash copiado al portapapeles"), 
@@ -896,18 +1121,39 @@ class MainScreen(Screen):
         btn_cerrar.bind(on_release=pop.dismiss)
         
         pop.open()
+        
+        def actualizar_popup(datos):
+            campos.update(self.campos_detalle_tx(tx, datos))
+            label.text = self.texto_detalle_tx(campos, es_envio)
+            pop.title = f"Tx: {campos['hash'][:16]}..."
+        
+        def consultar_nodo(tarea):
+            # Consultar al nodo para datos oficiales
+            datos = consultar_tx_en_nodo(tx_hash_completo)
+            if datos:
+                cache_detalles_tx.guardar(tx_hash_completo, datos)
+                if not tarea.cancelada:
+                    despachador_ui.publicar(lambda: actualizar_popup(datos), "detalle_tx")
+        
+        # Las transacciones confirmadas son inmutables: si ya están en caché no se consulta
+        if tx_hash_completo and datos_nodo is None:
+            gestor_tareas.lanzar("detalle_tx", consultar_nodo)
+            pop.bind(on_dismiss=lambda *a: gestor_tareas.cancelar("detalle_tx"))
 
     # ==================== MARKETPLACE ====================
     
     def abrir_marketplace(self):
+        from kivy.uix.recycleview import RecycleView
+        from kivy.uix.recycleboxlayout import RecycleBoxLayout
+        cargar_kv_marketplace()
+        
         layout = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(10))
         
         header = BoxLayout(size_hint_y=None, height=dp(50))
         header.add_widget(Label(text="MARKETPLACE", font_size='20sp', bold=True))
         layout.add_widget(header)
         
-        store = JsonStore('vlc_secure.json')
-        my_addr = store.get('user')['address']
+        my_addr = estado_wallet.address
         
         if my_addr == WALLET_FUNDADORA:
             btn_agregar = Button(
@@ -921,46 +1167,75 @@ class MainScreen(Screen):
             btn_agregar.bind(on_release=lambda x: self.mostrar_formulario_producto())
             layout.add_widget(btn_agregar)
         
-        scroll = ScrollView(size_hint=(1, 1))
-        self.products_list = BoxLayout(orientation='vertical', size_hint_y=None, height=0, spacing=dp(10))
-        scroll.add_widget(self.products_list)
-        layout.add_widget(scroll)
+        self.products_vacio = Label(text="", font_size='14sp', color=(0.5, 0.5, 0.5, 1),
+                                    size_hint_y=None, height=0)
+        layout.add_widget(self.products_vacio)
+        
+        # Lista virtualizada: solo se instancian los ProductItem visibles
+        self.products_list = RecycleView(size_hint=(1, 1), viewclass='ProductItem')
+        filas = RecycleBoxLayout(orientation='vertical', default_size=(None, dp(120)),
+                                 default_size_hint=(1, None), size_hint_y=None, spacing=dp(10))
+        filas.bind(minimum_height=filas.setter('height'))
+        self.products_list.add_widget(filas)
+        # Al llegar al final del scroll se agrega la siguiente página
+        self.products_list.bind(scroll_y=self.scroll_productos)
+        layout.add_widget(self.products_list)
         
         btn_cerrar = Button(text="CERRAR", size_hint_y=None, height=dp(45), background_color=(0.6, 0.15, 0.15, 1))
         layout.add_widget(btn_cerrar)
         
         self.popup_marketplace = Popup(title="", content=layout, size_hint=(0.95, 0.9))
         btn_cerrar.bind(on_release=self.popup_marketplace.dismiss)
+        self.popup_marketplace.bind(on_dismiss=lambda *a: gestor_tareas.cancelar("productos"))
         
-        threading.Thread(target=self.cargar_productos, daemon=True).start()
+        # Mostrar al instante el catálogo conocido; la revalidación corre en segundo plano
+        self.productos_mostrados = None
+        if catalogo.en_memoria() is not None:
+            self.mostrar_productos(catalogo.en_memoria())
+        gestor_tareas.lanzar("productos", self.cargar_productos)
         self.popup_marketplace.open()
     
-    def cargar_productos(self):
+    def cargar_productos(self, tarea, forzar=False):
         try:
-            r = requests.get(f"{MARKETPLACE_URL}/products", timeout=10)
-            productos = r.json()
-            Clock.schedule_once(lambda dt: self.mostrar_productos(productos))
+            productos = catalogo.obtener(forzar=forzar)
+            if tarea.cancelada:
+                return
+            # Si la revalidación devolvió la misma copia que ya está en pantalla no se redibuja
+            if productos is not self.productos_mostrados:
+                despachador_ui.publicar(lambda: self.mostrar_productos(productos), "productos")
         except Exception as e:
             print(f"Error cargando productos: {e}")
-            Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "No se pudieron cargar los productos"))
+            if not tarea.cancelada:
+                despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "No se pudieron cargar los productos"))
     
     def mostrar_productos(self, productos):
-        self.products_list.clear_widgets()
-        self.products_list.height = 0
-        
-        for prod in productos:
-            item = Factory.ProductItem()
-            item.ids.prod_title.text = prod.get('title', 'Sin título')
-            item.ids.prod_price.text = f"{prod.get('price', 0)} VLC"
-            item.ids.prod_desc.text = prod.get('description', '')[:50] + '...'
-            item.ids.btn_buy.bind(on_release=lambda x, p=prod: self.comprar_producto(p))
-            self.products_list.add_widget(item)
-            self.products_list.height += dp(130)
+        self.products_list.data = []
+        self.productos_mostrados = productos
+        self.productos_renderizados = 0
         
         if not productos:
-            label = Label(text="No hay productos disponibles", font_size='14sp', color=(0.5, 0.5, 0.5, 1))
-            self.products_list.add_widget(label)
-            self.products_list.height = dp(50)
+            self.products_vacio.text = "No hay productos disponibles"
+            self.products_vacio.height = dp(50)
+            return
+        
+        self.products_vacio.text = ""
+        self.products_vacio.height = 0
+        self.mostrar_pagina_productos()
+    
+    def mostrar_pagina_productos(self):
+        inicio = self.productos_renderizados
+        fin = min(inicio + TAMANO_PAGINA_CATALOGO, len(self.productos_mostrados))
+        
+        # Agregar la página al final sin tocar las filas ya cargadas
+        self.products_list.data.extend(
+            fila_producto(prod) for prod in self.productos_mostrados[inicio:fin]
+        )
+        self.productos_renderizados = fin
+    
+    def scroll_productos(self, scroll, scroll_y):
+        if (scroll_y <= 0.05 and self.productos_mostrados and
+                self.productos_renderizados < len(self.productos_mostrados)):
+            self.mostrar_pagina_productos()
     
     def mostrar_formulario_producto(self):
         layout = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(15))
@@ -1016,32 +1291,34 @@ class MainScreen(Screen):
         pop.open()
     
     def autenticar_y_crear_producto(self, producto_data, popup_formulario):
-        store = JsonStore('vlc_secure.json').get('user')
-        wallet = store['address']
-        pub_key = store['pub']
+        wallet = estado_wallet.address
+        pub_key = estado_wallet.pub
         
-        def auth_and_create():
-            if autenticar_en_marketplace(wallet, pub_key):
+        def auth_and_create(tarea):
+            if gestor_auth.asegurar(wallet, pub_key):
                 try:
-                    r_create = marketplace_session.post(
+                    r_create = gestor_auth.post(
                         f"{MARKETPLACE_URL}/products",
                         json=producto_data,
                         timeout=10
                     )
                     
                     if r_create.status_code == 200:
-                        Clock.schedule_once(lambda dt: popup_formulario.dismiss(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Éxito", "Producto creado correctamente"), 0)
-                        Clock.schedule_once(lambda dt: self.cargar_productos(), 0)
+                        despachador_ui.publicar(lambda: popup_formulario.dismiss())
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion("Éxito", "Producto creado correctamente"))
+                        # Si hay una revalidación en curso se reemplaza por una forzada
+                        gestor_tareas.cancelar("productos")
+                        gestor_tareas.lanzar("productos", self.cargar_productos, True)
                     else:
                         error = r_create.json().get('error', 'Error desconocido')
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"No se pudo crear: {error}"), 0)
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", f"No se pudo crear: {error}"))
                 except Exception as e:
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Error de conexión: {str(e)}"), 0)
+                    despachador_ui.publicar(lambda e=e: self.mostrar_notificacion("Error", f"Error de conexión: {str(e)}"))
             else:
-                Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "Autenticación fallida"), 0)
+                despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "Autenticación fallida"))
         
-        threading.Thread(target=auth_and_create, daemon=True).start()
+        if gestor_tareas.lanzar("crear_producto", auth_and_create) is None:
+            self.mostrar_notificacion("Info", "Ya se está creando un producto")
     
     def comprar_producto(self, producto):
         product_id = producto.get('id')
@@ -1074,105 +1351,139 @@ class MainScreen(Screen):
         CORREGIDO: Verifica en el blockchain si ya existe un pago para este producto
         ANTES de enviar dinero. Usa el endpoint /check_purchase del marketplace.
         """
-        store = JsonStore('vlc_secure.json').get('user')
-        my_addr = store['address']
-        pub_key = store['pub']
+        my_addr = estado_wallet.address
+        pub_key = estado_wallet.pub
         
-        # ========== PASO 1: AUTENTICACIÓN ==========
+        # ========== PASO 1: VERIFICACIONES EN PARALELO ==========
+        # Autenticación + /check_purchase, balance y sincronización de la cadena son
+        # independientes: se lanzan a la vez y se espera solo al más lento
         self.mostrar_popup_cargando("Verificando...")
+        cronometro = CronometroEtapas("compra")
         
-        def proceso_completo():
+        def autenticar_y_verificar_compra():
+            with cronometro.etapa("auth"):
+                if not gestor_auth.asegurar(my_addr, pub_key):
+                    return None
             try:
+                # Usar el endpoint /check_purchase del marketplace
+                with cronometro.etapa("check_purchase"):
+                    r_check = gestor_auth.get(
+                        f"{MARKETPLACE_URL}/check_purchase/{product_id}",
+                        timeout=10
+                    )
+                if r_check.status_code == 200:
+                    return bool(r_check.json().get('purchased'))
+            except Exception as e:
+                print(f"Error verificando compra previa: {e}")
+            # El endpoint no existe o falló: se decide con la cadena local
+            return False
+        
+        def consultar_balance():
+            with cronometro.etapa("balance"):
+                return nodo.saldo(my_addr)
+        
+        def buscar_pago_previo():
+            # Buscar transacciones anteriores a WALLET_FUNDADORA con el mismo monto
+            # en el índice local (solo se descargan los bloques nuevos)
+            with cronometro.etapa("sync_cadena"):
+                sincronizador = self.obtener_sincronizador(my_addr)
+                sincronizador.sincronizar()
+                return any(
+                    abs(float(tx.get('monto') or 0) - precio) < 0.01
+                    for tx in sincronizador.pagos(my_addr, WALLET_FUNDADORA)
+                )
+        
+        def ya_comprado():
+            despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+            despachador_ui.publicar(lambda: self.mostrar_notificacion(
+                "Info", 
+                "Ya tienes este producto. Ve a 'Mis Compras' para descargarlo."
+            ))
+        
+        def proceso_completo(tarea):
+            try:
+                futuro_auth = pool_red.submit(autenticar_y_verificar_compra)
+                futuro_balance = pool_red.submit(consultar_balance)
+                futuro_pago = pool_red.submit(buscar_pago_previo)
+                
                 # Verificar autenticación
-                if not autenticar_en_marketplace(my_addr, pub_key):
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "Autenticación fallida"), 0)
+                comprado = futuro_auth.result()
+                if comprado is None:
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "Autenticación fallida"))
                     return
                 
                 # ========== PASO 2: VERIFICAR SI YA COMPRÓ ESTE PRODUCTO ==========
-                Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Verificando compras..."), 0)
+                if comprado:
+                    ya_comprado()
+                    return
                 
                 try:
-                    # Usar el endpoint /check_purchase del marketplace
-                    r_check = marketplace_session.get(
-                        f"{MARKETPLACE_URL}/check_purchase/{product_id}",
-                        timeout=10
-                    )
-                    
-                    if r_check.status_code == 200:
-                        resultado = r_check.json()
-                        if resultado.get('purchased'):
-                            Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                            Clock.schedule_once(lambda dt: self.mostrar_notificacion(
-                                "Info", 
-                                "Ya tienes este producto. Ve a 'Mis Compras' para descargarlo."
-                            ), 0)
-                            return
+                    if futuro_pago.result():
+                        # Verificar si es para este producto consultando si puede descargar
+                        try:
+                            with cronometro.etapa("download_check"):
+                                r_download_check = gestor_auth.get(
+                                    f"{MARKETPLACE_URL}/download/{product_id}",
+                                    timeout=5
+                                )
+                            if r_download_check.status_code == 200:
+                                ya_comprado()
+                                return
+                        except:
+                            pass
+                except Exception as e:
+                    print(f"Error verificando blockchain: {e}")
+                    # Continuar de todas formas, el /buy fallará si ya existe
+                
+                # ========== PASO 3: VERIFICAR BALANCE ==========
+                # Antes de reservar, para no dejar reservas que no se van a pagar
+                try:
+                    balance = futuro_balance.result()
                     
-                    # Si el endpoint no existe o falla, verificar en el blockchain localmente
-                    # Buscar transacciones anteriores a WALLET_FUNDADORA con el mismo monto
-                    try:
-                        r_blocks = requests.get(f"{NODE_URL}/blocks", timeout=10).json()
-                        for bloque in r_blocks:
-                            for tx in bloque.get('transactions', []):
-                                # Si ya envió dinero a la wallet fundadora con el mismo monto
-                                if (tx.get('from') == my_addr and 
-                                    tx.get('to') == WALLET_FUNDADORA and
-                                    abs(float(tx.get('amount', 0)) - precio) < 0.01):
-                                    
-                                    # Verificar si es para este producto consultando si puede descargar
-                                    try:
-                                        r_download_check = marketplace_session.get(
-                                            f"{MARKETPLACE_URL}/download/{product_id}",
-                                            timeout=5
-                                        )
-                                        if r_download_check.status_code == 200:
-                                            Clock.schedule_once(lambda dt:                       self.cerrar_popup_cargando(), 0)
-                                            Clock.schedule_once(lambda dt: self.mostrar_notificacion(
-                                                "Info", 
-                                                "Ya tienes este producto. Ve a 'Mis Compras' para descargarlo."
-                                            ), 0)
-                                            return
-                                    except:
-                                        pass
-                    except Exception as e:
-                        print(f"Error verificando blockchain: {e}")
-                        # Continuar de todas formas, el /buy fallará si ya existe
-                        
+                    if balance < precio:
+                        despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion(
+                            "Error", 
+                            f"Balance insuficiente. Tienes {balance} VLC, necesitas {precio} VLC"
+                        ))
+                        return
                 except Exception as e:
-                    print(f"Error verificando compra previa: {e}")
-                    # Continuar, el /buy del marketplace tiene su propia validación
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda e=e: self.mostrar_notificacion("Error", f"No se pudo verificar balance: {str(e)}"))
+                    return
                 
-                # ========== PASO 3: INTENTAR REGISTRAR COMPRA EN MARKETPLACE PRIMERO ==========
+                # ========== PASO 4: INTENTAR REGISTRAR COMPRA EN MARKETPLACE ==========
                 # Esto es la clave: el marketplace tiene una transacción atómica
                 # Si falla aquí, NO se ha enviado dinero todavía
                 
-                Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Reservando producto..."), 0)
+                despachador_ui.publicar(lambda: self.mostrar_popup_cargando("Reservando producto..."), "popup_cargando")
                 
                 try:
                     # Intentar crear la compra en el marketplace SIN enviar pago aún
                     # El endpoint /buy del marketplace verifica si ya existe y crea el registro
-                    r_reserve = marketplace_session.post(
-                        f"{MARKETPLACE_URL}/buy",
-                        json={"product_id": product_id},
-                        timeout=10
-                    )
+                    with cronometro.etapa("buy"):
+                        r_reserve = gestor_auth.post(
+                            f"{MARKETPLACE_URL}/buy",
+                            json={"product_id": product_id},
+                            timeout=10
+                        )
                     
                     if r_reserve.status_code == 400 and 'already purchased' in r_reserve.text.lower():
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion(
+                        despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion(
                             "Info", 
                             "Ya tienes este producto. Ve a 'Mis Compras' para descargarlo."
-                        ), 0)
+                        ))
                         return
                     
                     if r_reserve.status_code != 200:
                         error = r_reserve.json().get('error', 'Error desconocido')
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion(
+                        despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion(
                             "Error", 
                             f"No se pudo reservar el producto: {error}"
-                        ), 0)
+                        ))
                         return
                     
                     # La compra se reservó exitosamente en el marketplace
@@ -1180,81 +1491,49 @@ class MainScreen(Screen):
                     tx_hash_reservado = r_reserve.json().get('tx_hash')
                     
                 except Exception as e:
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion(
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda e=e: self.mostrar_notificacion(
                         "Error", 
                         f"Error conectando con marketplace: {str(e)}"
-                    ), 0)
-                    return
-                
-                # ========== PASO 4: VERIFICAR BALANCE ==========
-                Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Verificando balance..."), 0)
-                
-                try:
-                    r_bal = requests.get(f"{NODE_URL}/balance/{my_addr}", timeout=10).json()
-                    balance = r_bal.get('balance', 0)
-                    
-                    if balance < precio:
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion(
-                            "Error", 
-                            f"Balance insuficiente. Tienes {balance} VLC, necesitas {precio} VLC"
-                        ), 0)
-                        return
-                except Exception as e:
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"No se pudo verificar balance: {str(e)}"), 0)
+                    ))
                     return
                 
                 # ========== PASO 5: PREPARAR Y ENVIAR TRANSACCIÓN ==========
-                nonce = int(time.time() * 1000)
-                firma = firmar_transaccion_nodo(pub_key, my_addr, WALLET_FUNDADORA, precio, nonce)
+                payload_tx = construir_transaccion(my_addr, pub_key, WALLET_FUNDADORA, precio)
                 
-                if not firma:
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "No se pudo firmar la transacción"), 0)
+                if not payload_tx:
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "No se pudo firmar la transacción"))
                     return
                 
-                payload_tx = {
-                    "from": my_addr,
-                    "to": WALLET_FUNDADORA,
-                    "amount": precio,
-                    "nonce": nonce,
-                    "public_key": pub_key,
-                    "signature": firma
-                }
-                
-                Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Enviando pago..."), 0)
+                despachador_ui.publicar(lambda: self.mostrar_popup_cargando("Enviando pago..."), "popup_cargando")
                 
                 try:
-                    r_send = requests.post(f"{NODE_URL}/send", json=payload_tx, timeout=10)
-                    resp_send = r_send.json()
+                    with cronometro.etapa("send"):
+                        r_send = nodo.enviar(payload_tx)
+                        resp_send = r_send.json()
                     
                     if not resp_send.get('accepted'):
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
+                        despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
                         error = resp_send.get('error', 'Error desconocido')
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Pago rechazado: {error}"), 0)
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", f"Pago rechazado: {error}"))
                         return
                     
                     tx_hash = resp_send.get('tx_hash') or calcular_tx_hash_completo(payload_tx)
                     
                 except Exception as e:
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Error enviando pago: {str(e)}"), 0)
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda e=e: self.mostrar_notificacion("Error", f"Error enviando pago: {str(e)}"))
                     return
                 
-                # ========== PASO 6: MINAR BLOQUE ==========
-                Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Confirmando transacción..."), 0)
-                
-                try:
-                    requests.post(f"{NODE_URL}/mine", json={}, timeout=30)
-                except Exception as e:
-                    print(f"Error minando (continuando): {e}")
+                # ========== PASO 6: CONFIRMACIÓN EN SEGUNDO PLANO ==========
+                # No se espera al minado: la fila del historial pasa a confirmada cuando llegue el bloque
+                self.confirmar_en_segundo_plano([tx_hash])
                 
                 # ========== PASO 7: ÉXITO ==========
-                Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
+                despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
                 
-                # Guardar en caché local
+                # Guardar en el almacén local de compras (sobrevive a reinicios)
                 if producto_info:
                     compra_data = {
                         'product_id': product_id,
@@ -1264,26 +1543,30 @@ class MainScreen(Screen):
                         'timestamp': int(time.time()),
                         'tx_hash': tx_hash
                     }
-                    existe = any(c['product_id'] == product_id for c in self.mis_compras_cache)
-                    if not existe:
-                        self.mis_compras_cache.append(compra_data)
+                    almacen_compras.agregar(my_addr, [compra_data])
                 
-                Clock.schedule_once(lambda dt: self.mostrar_notificacion(
+                despachador_ui.publicar(lambda: self.mostrar_notificacion(
                     "Éxito", 
-                    "¡Compra exitosa! Ve a 'Mis Compras' para descargar."
-                ), 0)
-                Clock.schedule_once(lambda dt: self.actualizar_todo(), 0)
+                    "¡Compra exitosa! Ve a 'Mis Compras' para descargar.\n\nEl pago se confirmará en unos momentos."
+                ))
+                despachador_ui.publicar(lambda: self.actualizar_todo(), "refresco")
                     
             except Exception as e:
                 print(f"Error general en proceso_compra: {e}")
-                Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Error inesperado: {str(e)}"), 0)
-        
-        threading.Thread(target=proceso_completo, daemon=True).start()
+                despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                despachador_ui.publicar(lambda e=e: self.mostrar_notificacion("Error", f"Error inesperado: {str(e)}"))
+            finally:
+                self.ultimos_tiempos_compra = cronometro.reportar()
+        
+        # Una compra a la vez; nunca se cancela porque puede haber un pago en vuelo
+        if gestor_tareas.lanzar("compra", proceso_completo) is None:
+            self.mostrar_notificacion("Info", "Ya hay una compra en curso")
 
     # ==================== MIS COMPRAS ====================
     
     def abrir_mis_compras(self):
+        cargar_kv_marketplace()
+        
         layout = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(10))
         
         header = BoxLayout(size_hint_y=None, height=dp(50))
@@ -1300,94 +1583,105 @@ class MainScreen(Screen):
         
         self.popup_mis_compras = Popup(title="", content=layout, size_hint=(0.95, 0.9))
         btn_cerrar.bind(on_release=self.popup_mis_compras.dismiss)
+        self.popup_mis_compras.bind(on_dismiss=lambda *a: gestor_tareas.cancelar("mis_compras"))
         
-        threading.Thread(target=self.cargar_mis_compras, daemon=True).start()
+        # Las compras guardadas se muestran al instante; la revalidación corre en segundo plano
+        self.mostrar_mis_compras(almacen_compras.listar(estado_wallet.address))
+        self.cargar_mis_compras()
         self.popup_mis_compras.open()
     
     def cargar_mis_compras(self):
-        store = JsonStore('vlc_secure.json').get('user')
-        my_addr = store['address']
-        pub_key = store['pub']
+        my_addr = estado_wallet.address
+        pub_key = estado_wallet.pub
         
-        def auth_and_load():
-            # Primero mostrar compras en caché
-            compras = list(self.mis_compras_cache)
+        def auth_and_load(tarea):
+            # Las compras guardadas ya están en pantalla (ver abrir_mis_compras)
+            compras = almacen_compras.listar(my_addr)
             
-            if not autenticar_en_marketplace(my_addr, pub_key):
-                # Si falla auth, mostrar al menos las compras en caché
-                Clock.schedule_once(lambda dt: self.mostrar_mis_compras(compras))
+            if not gestor_auth.asegurar(my_addr, pub_key) or tarea.cancelada:
+                # Si falla auth, se quedan las compras guardadas
                 return
             
             try:
-                # Obtener productos del marketplace
-                r_products = marketplace_session.get(f"{MARKETPLACE_URL}/products", timeout=10)
-                products = {p['id']: p for p in r_products.json()}
+                # Obtener productos del marketplace (copia compartida con el popup del marketplace)
+                products = catalogo.por_id()
+                if tarea.cancelada:
+                    return
                 
                 # Buscar en el historial de transacciones pagos al marketplace
                 try:
-                    r_blocks = requests.get(f"{NODE_URL}/blocks", timeout=10).json()
-                    for bloque in r_blocks:
-                        for tx in bloque.get('transactions', []):
-                            # Si enviaste dinero a la wallet fundadora, es una compra
-                            if tx.get('from') == my_addr and tx.get('to') == WALLET_FUNDADORA:
-                                monto = float(tx.get('amount', 0))
-                                # Buscar producto con ese precio
-                                for prod_id, product in products.items():
-                                    if abs(product.get('price', 0) - monto) < 0.01:
-                                        # Verificar si ya está en la lista
-                                        existe = False
-                                        for c in compras:
-                                            if c['product_id'] == prod_id:
-                                                existe = True
-                                                break
-                                        if not existe:
-                                            compras.append({
-                                                'product_id': prod_id,
-                                                'title': product.get('title', 'Producto'),
-                                                'price': product.get('price', 0),
-                                                'status': 'completed'
-                                            })
+                    sincronizador = self.obtener_sincronizador(my_addr)
+                    sincronizador.sincronizar()
+                    if tarea.cancelada:
+                        return
+                    # Si enviaste dinero a la wallet fundadora, es una compra
+                    reconstruir_compras(
+                        sincronizador.pagos(my_addr, WALLET_FUNDADORA),
+                        catalogo.indice_precios(),
+                        compras
+                    )
                 except Exception as e:
                     print(f"Error buscando en historial: {e}")
                 
+                # Productos con acceso ya confirmado en sesiones anteriores: no se sondean
+                ids_compras = {c['product_id'] for c in compras}
+                confirmados = cache_derechos.productos(my_addr)
+                for prod_id in confirmados:
+                    if prod_id in products and prod_id not in ids_compras:
+                        compras.append(compra_desde_producto(products[prod_id]))
+                        ids_compras.add(prod_id)
+                
+                # Mostrar ya lo encontrado (solo si cambió algo respecto a lo guardado);
+                # los sondeos van agregando filas a medida que responden
+                if almacen_compras.agregar(my_addr, compras) and not tarea.cancelada:
+                    despachador_ui.publicar(lambda: self.mostrar_mis_compras(compras), "mis_compras")
+                if tarea.cancelada:
+                    return
+                
                 # Intentar verificar descargas (sin consumir intentos)
                 # Solo verificamos el status, no descargamos
-                for prod_id in list(products.keys()):
+                def sondear(prod_id):
                     try:
-                        r_check = marketplace_session.get(
+                        r_check = gestor_auth.get(
                             f"{MARKETPLACE_URL}/download/{prod_id}",
                             timeout=3
                         )
-                        if r_check.status_code == 200:
-                            # Tiene acceso de descarga, agregar si no está
-                            existe = False
-                            for c in compras:
-                                if c['product_id'] == prod_id:
-                                    existe = True
-                                    break
-                            if not existe:
-                                product = products[prod_id]
-                                compras.append({
-                                    'product_id': prod_id,
-                                    'title': product.get('title', 'Producto'),
-                                    'price': product.get('price', 0),
-                                    'status': 'completed'
-                                })
+                        return r_check.status_code == 200
                     except:
-                        pass
+                        return False
                 
-                Clock.schedule_once(lambda dt: self.mostrar_mis_compras(compras))
+                pendientes = {
+                    pool_sondeos.submit(sondear, prod_id): prod_id
+                    for prod_id in products if prod_id not in ids_compras
+                }
+                restantes = set(pendientes)
+                while restantes:
+                    # Se espera de a poco para soltar el hilo apenas se cierra el popup
+                    listos, restantes = wait(restantes, timeout=0.25, return_when=FIRST_COMPLETED)
+                    if tarea.cancelada:
+                        # Popup cerrado: los sondeos que aún no empezaron no se envían
+                        for f in restantes:
+                            f.cancel()
+                        return
+                    for futuro in listos:
+                        prod_id = pendientes[futuro]
+                        if futuro.result():
+                            # Tiene acceso de descarga: recordarlo y agregarlo a la lista
+                            cache_derechos.agregar(my_addr, prod_id)
+                            compra = compra_desde_producto(products[prod_id])
+                            almacen_compras.agregar(my_addr, [compra])
+                            despachador_ui.publicar(lambda c=compra: self.agregar_compra_a_lista(c))
                 
             except Exception as e:
+                # Se quedan en pantalla las compras guardadas
                 print(f"Error cargando compras: {e}")
-                # Mostrar al menos las compras en caché
-                Clock.schedule_once(lambda dt: self.mostrar_mis_compras(compras))
         
-        threading.Thread(target=auth_and_load, daemon=True).start()
+        gestor_tareas.lanzar("mis_compras", auth_and_load)
     
     def mostrar_mis_compras(self, compras):
         self.purchases_list.clear_widgets()
         self.purchases_list.height = 0
+        self.purchases_vacio = None
         
         if not compras:
             label = Label(
@@ -1398,49 +1692,39 @@ class MainScreen(Screen):
             )
             self.purchases_list.add_widget(label)
             self.purchases_list.height = dp(100)
+            self.purchases_vacio = label
             return
         
         for compra in compras:
-            item = Factory.PurchaseItem()
-            item.ids.purchase_title.text = compra['title']
-            item.ids.purchase_status.text = f"Estado: {compra['status'].upper()}"
-            
-            prod_id = compra['product_id']
-            item.ids.btn_download.bind(on_release=lambda x, pid=prod_id: self.descargar_producto(pid))
-            item.ids.btn_details.bind(on_release=lambda x, c=compra: self.mostrar_detalle_compra(c))
-            
-            self.purchases_list.add_widget(item)
-            self.purchases_list.height += dp(110)
+            self.agregar_compra_a_lista(compra)
+    
+    def agregar_compra_a_lista(self, compra):
+        # Quitar el mensaje de "sin compras" si una compra llega después
+        if self.purchases_vacio is not None:
+            self.purchases_list.remove_widget(self.purchases_vacio)
+            self.purchases_list.height = 0
+            self.purchases_vacio = None
+        
+        item = Factory.PurchaseItem()
+        item.ids.purchase_title.text = compra['title']
+        item.ids.purchase_status.text = f"Estado: {compra['status'].upper()}"
+        
+        prod_id = compra['product_id']
+        item.ids.btn_download.bind(on_release=lambda x, pid=prod_id: self.descargar_producto(pid))
+        item.ids.btn_details.bind(on_release=lambda x, c=compra: self.mostrar_detalle_compra(c))
+        
+        self.purchases_list.add_widget(item)
+        self.purchases_list.height += dp(110)
     
     def descargar_producto(self, product_id):
         """
         SOLUCIÓN: Genera una URL de descarga con token temporal firmado.
         El servidor debe modificar su endpoint /download para aceptar estos parámetros.
         """
-        store = JsonStore('vlc_secure.json')
-        user_data = store.get('user')
-        my_addr = user_data['address']
-        pub_key = user_data['pub']
-        
-        # Generar token temporal (válido por 30 minutos)
-        expira_en = 30 * 60  # 30 minutos en segundos
-        timestamp_expiracion = int(time.time()) + expira_en
-        
-        # Crear firma de autorización usando pub_key (NO priv_key)
-        # wallet + product_id + expiración
-        mensaje = f"{my_addr}:{product_id}:{timestamp_expiracion}"
-        firma = sha256(sha256(pub_key) + mensaje)
-        
-        # Construir URL con parámetros de autenticación
-        from urllib.parse import urlencode
-        params = {
-            'wallet': my_addr,
-            'pubkey': pub_key,
-            'expires': timestamp_expiracion,
-            'signature': firma
-        }
-        query_string = urlencode(params)
-        download_url = f"{MARKETPLACE_URL}/download/{product_id}?{query_string}"
+        import webbrowser
+        
+        # Token temporal (válido por 30 minutos) firmado con la pub_key (NO priv_key)
+        download_url = url_descarga_firmada(estado_wallet.address, estado_wallet.pub, product_id)
         
         print(f"Abriendo navegador con URL: {download_url[:100]}...")
         
@@ -1508,7 +1792,6 @@ class MainScreen(Screen):
         self.popup_envio = Popup(title="Enviar VelCoin", content=layout, size_hint=(0.9, None), height=dp(280))
 
         def confirmar(instance):
-            store = JsonStore('vlc_secure.json').get('user')
             monto_str = cant.text.strip()
             destino = dest.text.strip()
             
@@ -1524,64 +1807,45 @@ class MainScreen(Screen):
                 self.mostrar_notificacion("Error", "Monto inválido")
                 return
             
-            nonce = int(time.time() * 1000)
-            firma = firmar_transaccion_nodo(store['pub'], store['address'], destino, monto, nonce)
+            payload = construir_transaccion(estado_wallet.address, estado_wallet.pub, destino, monto)
             
-            if not firma:
+            if not payload:
                 self.mostrar_notificacion("Error", "No se pudo firmar la transacción")
                 return
             
-            payload = {
-                "from": store['address'],
-                "to": destino,
-                "amount": monto,
-                "nonce": nonce,
-                "public_key": store['pub'],
-                "signature": firma
-            }
-            
             self.mostrar_popup_cargando("Enviando transacción...")
             
-            def enviar_y_minar():
+            def enviar_y_minar(tarea):
                 try:
-                    r = requests.post(f"{NODE_URL}/send", json=payload, timeout=10)
+                    r = nodo.enviar(payload)
                     respuesta = r.json()
                     
                     if not respuesta.get('accepted'):
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
+                        despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
                         error = respuesta.get('error', 'Error desconocido')
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Transacción rechazada: {error}"), 0)
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_envio(), 0)
+                        despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", f"Transacción rechazada: {error}"))
+                        despachador_ui.publicar(lambda: self.cerrar_popup_envio(), "popup_envio")
                         return
                     
-                    Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Minando bloque..."), 0)
-                    r_mine = requests.post(f"{NODE_URL}/mine", json={}, timeout=30)
+                    tx_hash = respuesta.get('tx_hash') or calcular_tx_hash_completo(payload)
                     
-                    if r_mine.status_code == 200:
-                        resultado = r_mine.json()
-                        if resultado.get('success'):
-                            Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                            Clock.schedule_once(lambda dt: self.cerrar_popup_envio(), 0)
-                            Clock.schedule_once(lambda dt: self.actualizar_todo(), 0)
-                            Clock.schedule_once(lambda dt: self.mostrar_notificacion("Éxito", f"¡Transacción confirmada! Bloque #{resultado['block']['index']}"), 0)
-                        else:
-                            Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                            Clock.schedule_once(lambda dt: self.cerrar_popup_envio(), 0)
-                            Clock.schedule_once(lambda dt: self.actualizar_todo(), 0)
-                            Clock.schedule_once(lambda dt: self.mostrar_notificacion("Advertencia", "Transacción enviada pero el minado falló. Presiona REFRESCAR."), 0)
-                    else:
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_envio(), 0)
-                        Clock.schedule_once(lambda dt: self.actualizar_todo(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Advertencia", "Transacción enviada pero el minado falló. Presiona REFRESCAR."), 0)
+                    # La transacción ya está en el mempool: se cierran los popups y la
+                    # confirmación se sigue en segundo plano
+                    self.confirmar_en_segundo_plano([tx_hash])
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda: self.cerrar_popup_envio(), "popup_envio")
+                    despachador_ui.publicar(lambda: self.actualizar_todo(), "refresco")
+                    despachador_ui.publicar(lambda: self.mostrar_notificacion("Éxito", "¡Transacción enviada! Aparecerá como confirmada cuando entre en un bloque."))
                         
                 except Exception as err:
                     print(f"Error en enviar_y_minar: {err}")
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Fallo de conexión: {str(err)}"), 0)
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_envio(), 0)
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda err=err: self.mostrar_notificacion("Error", f"Fallo de conexión: {str(err)}"))
+                    despachador_ui.publicar(lambda: self.cerrar_popup_envio(), "popup_envio")
             
-            threading.Thread(target=enviar_y_minar, daemon=True).start()
+            if gestor_tareas.lanzar("envio", enviar_y_minar) is None:
+                self.cerrar_popup_cargando()
+                self.mostrar_notificacion("Info", "Ya hay un envío en curso")
 
         btn.bind(on_release=confirmar)
         self.popup_envio.open()
@@ -1607,41 +1871,79 @@ class MainScreen(Screen):
     def refrescar_y_minar(self):
         self.mostrar_popup_cargando("Verificando mempool...")
         
-        def verificar_y_minar():
+        def avisar_minado(exito, index):
+            if exito:
+                despachador_ui.publicar(lambda: self.mostrar_notificacion("Éxito", f"Bloque minado! #{index}"))
+            else:
+                despachador_ui.publicar(lambda: self.mostrar_notificacion("Error", "El minado no tuvo éxito"))
+        
+        def verificar_y_minar(tarea):
             try:
-                r_mempool = requests.get(f"{NODE_URL}/mempool", timeout=10)
+                r_mempool = nodo.mempool()
                 mempool = r_mempool.json()
                 
                 if len(mempool) == 0:
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.actualizar_todo(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Info", "No hay transacciones pendientes"), 0)
+                    despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                    despachador_ui.publicar(lambda: self.actualizar_todo(), "refresco")
+                    despachador_ui.publicar(lambda: self.mostrar_notificacion("Info", "No hay transacciones pendientes"))
                     return
                 
-                Clock.schedule_once(lambda dt: self.mostrar_popup_cargando("Minando bloque..."), 0)
-                r_mine = requests.post(f"{NODE_URL}/mine", json={}, headers={"Content-Type": "application/json"}, timeout=30)
-                
-                if r_mine.status_code == 200:
-                    resultado = r_mine.json()
-                    if resultado.get('success'):
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                        Clock.schedule_once(lambda dt: self.actualizar_todo(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Éxito", f"Bloque minado! #{resultado['block']['index']}"), 0)
-                    else:
-                        Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                        Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "El minado no tuvo éxito"), 0)
-                else:
-                    Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                    Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", "Error al minar"), 0)
+                # Hay pendientes: pedir un bloque sin esperarlo y seguir las transacciones de la wallet
+                addr = estado_wallet.address
+                propias = [tx for tx in mempool if tx.get('from') == addr or tx.get('to') == addr]
+                self.confirmar_en_segundo_plano(calcular_tx_hashes(propias), al_minar=avisar_minado)
+                despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                despachador_ui.publicar(lambda: self.actualizar_todo(), "refresco")
             except Exception as err:
-                Clock.schedule_once(lambda dt: self.cerrar_popup_cargando(), 0)
-                Clock.schedule_once(lambda dt: self.mostrar_notificacion("Error", f"Error de conexión: {str(err)}"), 0)
+                despachador_ui.publicar(lambda: self.cerrar_popup_cargando(), "popup_cargando")
+                despachador_ui.publicar(lambda err=err: self.mostrar_notificacion("Error", f"Error de conexión: {str(err)}"))
         
-        threading.Thread(target=verificar_y_minar, daemon=True).start()
+        if gestor_tareas.lanzar("mempool", verificar_y_minar) is None:
+            # Ya hay una verificación en curso con su propio popup
+            return
+
+
+    def obtener_seguidor_confirmaciones(self):
+        if self.seguidor_confirmaciones is None:
+            self.seguidor_confirmaciones = SeguidorConfirmaciones(
+                programar=lambda fn, espera: Clock.schedule_once(lambda dt: fn(), espera),
+                # El refresco incremental cambia la fila de pendiente a confirmada
+                al_confirmar=lambda tx_hash, datos: despachador_ui.publicar(lambda: self.actualizar_todo(), "refresco")
+            )
+        return self.seguidor_confirmaciones
+
+    def confirmar_en_segundo_plano(self, tx_hashes, al_minar=None):
+        """
+        Pide al nodo que mine un bloque sin esperar la respuesta y sigue los
+        hashes hasta que se confirmen. Ningún popup queda abierto mientras tanto.
+        `al_minar(exito, index)` recibe el resultado y el índice del bloque minado.
+        """
+        seguidor = self.obtener_seguidor_confirmaciones()
+        for tx_hash in tx_hashes:
+            seguidor.seguir(tx_hash)
 
+        def minar():
+            exito, index = False, None
+            try:
+                r_mine = nodo.minar()
+                resultado = r_mine.json() if r_mine.status_code == 200 else {}
+                if resultado.get('success'):
+                    exito, index = True, (resultado.get('block') or {}).get('index', '?')
+                    # El bloque ya existe: no hace falta esperar a la próxima consulta
+                    seguidor.revisar_ahora()
+                else:
+                    print(f"El minado no tuvo éxito: {r_mine.status_code}")
+            except Exception as e:
+                print(f"Error minando (continuando): {e}")
+            if al_minar:
+                al_minar(exito, index)
+
+        pool_minado.submit(minar)
 
     def mostrar_mi_direccion(self):
-        addr = JsonStore('vlc_secure.json').get('user')['address']
+        from kivy.core.clipboard import Clipboard
+        
+        addr = estado_wallet.address
         layout = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(15))
         txt = TextInput(text=addr, readonly=True, size_hint_y=None, height=dp(50), font_size='12sp', halign='center')
         btn = Button(text="COPIAR AL PORTAPAPELES", background_color=(0.1, 0.8, 0.3, 1), size_hint_y=None, height=dp(50))
@@ -1685,13 +1987,34 @@ class MainScreen(Screen):
         self.mostrar_notificacion("Perfil", "Disponible próximamente")
 
     def logout(self):
-        if os.path.exists('vlc_secure.json'): os.remove('vlc_secure.json')
+        # Lo que siga en vuelo de esta wallet no vuelve a escribir los cachés que se borran abajo
+        for tipo in ("refresco", "mis_compras", "compra", "productos", "detalle_tx"):
+            gestor_tareas.cancelar(tipo)
+        with self.lock_sincronizador:
+            # Dentro del lock: obtener_sincronizador() ya no puede crear uno nuevo para esta wallet
+            estado_wallet.borrar()
+            if self.sincronizador:
+                self.sincronizador.descartar()
+            self.sincronizador = None
+        if self.seguidor_confirmaciones:
+            self.seguidor_confirmaciones.limpiar()
+        gestor_auth.cerrar_sesion()
+        cache_derechos.borrar()
+        almacen_compras.borrar()
+        catalogo.borrar()
+        AlmacenCadena().borrar()
+        cache_hashes.borrar()
+        cache_detalles_tx.borrar()
+        cache_estado_cuenta.borrar()
+        # Que la próxima wallet no vea por un instante los datos de esta
+        self.ids.history_list.data = []
+        self.restablecer_balance()
         self.manager.current = 'login'
 
 
 class LoginScreen(Screen):
     def create_new_wallet(self):
-        new_priv = ''.join(secrets.choice('0123456789abcdef') for _ in range(64))
+        new_priv = nueva_clave_privada()
         addr, pub, priv_norm = derivar_wallet_oficial(new_priv)
         
         content = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(10))
@@ -1710,6 +2033,7 @@ class LoginScreen(Screen):
         pop = Popup(title="Nueva Wallet", content=content, size_hint=(0.9, None), height=dp(380), auto_dismiss=False)
         
         def copiar_clave(instance):
+            from kivy.core.clipboard import Clipboard
             Clipboard.copy(new_priv)
             notif = Popup(title="Copiado", content=Label(text="Clave copiada"), size_hint=(0.6, None), height=dp(150))
             notif.open()
@@ -1718,7 +2042,7 @@ class LoginScreen(Screen):
         btn_copiar.bind(on_release=copiar_clave)
         
         def save(instance):
-            JsonStore('vlc_secure.json').put('user', address=addr, pub=pub, priv=priv_norm)
+            estado_wallet.guardar_usuario(addr, pub, priv_norm)
             pop.dismiss()
             self.manager.current = 'main'
         btn.bind(on_release=save)
@@ -1740,7 +2064,7 @@ class LoginScreen(Screen):
             
             addr, pub, priv_norm = derivar_wallet_oficial(priv)
             if addr:
-                JsonStore('vlc_secure.json').put('user', address=addr, pub=pub, priv=priv_norm)
+                estado_wallet.guardar_usuario(addr, pub, priv_norm)
                 pop.dismiss()
                 self.manager.current = 'main'
             else:
@@ -1764,13 +2088,29 @@ class LoginScreen(Screen):
 
 class VelCoinApp(App):
     def build(self):
+        # Única lectura del archivo de la wallet; después todo sale de memoria
+        estado_wallet.cargar()
         Builder.load_string(KV)
+        tiempos_arranque.marcar("kv")
         sm = ScreenManager(transition=FadeTransition())
         sm.add_widget(LoginScreen(name='login'))
         sm.add_widget(MainScreen(name='main'))
-        if JsonStore('vlc_secure.json').exists('user'):
+        if estado_wallet.existe:
             sm.current = 'main'
+        tiempos_arranque.marcar("build")
         return sm
 
+    def on_start(self):
+        # El callback corre después de dibujar el primer frame
+        Clock.schedule_once(self._primer_frame)
+
+    def _primer_frame(self, dt):
+        tiempos_arranque.marcar("primer_frame")
+        tiempos_arranque.reportar()
+
+
+tiempos_arranque = TiemposArranque(INICIO_ARRANQUE)
+tiempos_arranque.marcar("modulo")
+
 if __name__ == '__main__':
     VelCoinApp().run()
@@ -0,0 +1,86 @@
+"""Reintentos de ClienteNodo ante conexiones cortadas y timeouts de lectura."""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from velwallet_core import ClienteNodo  # noqa: E402
+
+RESPUESTA_BALANCE = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    b"Content-Length: 16\r\n\r\n{\"balance\": 7.5}"
+)
+
+
+class ServidorGuionado:
+    """Servidor TCP que atiende cada conexión según el guion: 'cortar', 'responder' o 'colgar'."""
+
+    def __init__(self, guion):
+        self.guion = list(guion)
+        self.conexiones = 0
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen(8)
+        self.url = f"http://127.0.0.1:{self.socket.getsockname()[1]}"
+        threading.Thread(target=self._atender, daemon=True).start()
+
+    def _atender(self):
+        while True:
+            try:
+                conexion, _ = self.socket.accept()
+            except OSError:
+                return
+            accion = self.guion[self.conexiones] if self.conexiones < len(self.guion) else "responder"
+            self.conexiones += 1
+            conexion.recv(65536)
+            if accion == "responder":
+                conexion.sendall(RESPUESTA_BALANCE)
+            elif accion == "colgar":
+                time.sleep(2)
+            conexion.close()
+
+    def cerrar(self):
+        self.socket.close()
+
+
+@pytest.fixture
+def servidor():
+    creados = []
+
+    def crear(guion):
+        s = ServidorGuionado(guion)
+        creados.append(s)
+        return s
+    yield crear
+    for s in creados:
+        s.cerrar()
+
+
+def test_conexion_cortada_se_reintenta(servidor):
+    s = servidor(["cortar", "responder"])
+    cliente = ClienteNodo(s.url, backoff=0)
+    assert cliente.saldo("x") == 7.5
+    assert s.conexiones == 2
+
+
+def test_timeout_de_lectura_no_se_reintenta(servidor):
+    s = servidor(["colgar", "colgar"])
+    cliente = ClienteNodo(s.url, timeouts={"balance": (1, 0.3)}, backoff=0)
+    with pytest.raises(requests.Timeout):
+        cliente.balance("x")
+    assert s.conexiones == 1
+
+
+def test_post_no_se_reintenta(servidor):
+    s = servidor(["cortar", "responder"])
+    cliente = ClienteNodo(s.url, backoff=0)
+    with pytest.raises(requests.ConnectionError):
+        cliente.enviar({})
+    assert s.conexiones == 1
@@ -0,0 +1,63 @@
+"""
+Núcleo de VelWallet sin dependencias de Kivy: claves y firmas, cliente del
+nodo, sincronización del historial y marketplace. La app (main.py) y los
+procesos sin interfaz usan esta misma API.
+
+    from velwallet_core import derivar_wallet_oficial, escanear_wallet
+
+    address, pub, priv = derivar_wallet_oficial(clave_privada)
+    estado = escanear_wallet(address)
+    print(estado["balance"], len(estado["historial"]))
+"""
+
+from .config import NODE_URL, MARKETPLACE_URL, WALLET_FUNDADORA
+from .cripto import (
+    sha256,
+    derivar_wallet_oficial,
+    firmar_transaccion_nodo,
+    firmar_challenge,
+    nueva_clave_privada,
+    construir_transaccion,
+    calcular_tx_hash_completo,
+    calcular_tx_hash_corto,
+)
+from .nodo import TIMEOUTS_NODO, SesionPerezosa, ClienteNodo, nodo, pool_red, pool_minado, consultar_tx_en_nodo
+from .cadena import (
+    AlmacenCadena,
+    CacheHashes,
+    CacheDetallesTx,
+    CacheEstadoCuenta,
+    ReorganizacionDetectada,
+    SincronizadorCadena,
+    SeguidorConfirmaciones,
+    cache_hashes,
+    cache_detalles_tx,
+    cache_estado_cuenta,
+    calcular_tx_hashes,
+    construir_registro_tx,
+    iterar_arreglo_json,
+    registros_pendientes,
+    ordenar_historial,
+    almacen_de_wallet,
+    pedir_balance,
+    escanear_wallet,
+)
+from .wallet import EstadoWallet, estado_wallet
+from .marketplace import (
+    marketplace_session,
+    autenticar_en_marketplace,
+    GestorAutenticacion,
+    gestor_auth,
+    CacheDerechosDescarga,
+    cache_derechos,
+    AlmacenCompras,
+    almacen_compras,
+    CatalogoProductos,
+    catalogo,
+    pool_sondeos,
+    compra_desde_producto,
+    indexar_por_precio,
+    productos_con_precio,
+    reconstruir_compras,
+    url_descarga_firmada,
+)
@@ -0,0 +1,659 @@
+"""
+Sincronización incremental de la cadena, historial de una dirección y
+seguimiento de confirmaciones.
+"""
+
+import codecs
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .cripto import calcular_tx_hash_completo, calcular_tx_hash_corto
+from .nodo import nodo, pool_red, consultar_tx_en_nodo
+
+
+CHAIN_STORE_PATH = 'vlc_chain.json'
+
+# Cantidad de hashes de bloques recientes que se guardan para detectar reorganizaciones
+VENTANA_REORG = 64
+MAX_REINTENTOS_REORG = 3
+
+# Tamaño de lectura de la respuesta de /blocks en modo streaming
+TAMANO_CHUNK_BLOQUES = 64 * 1024
+
+
+def iterar_arreglo_json(chunks):
+    """
+    Parser incremental de un arreglo JSON. Entrega los elementos uno a uno a
+    medida que llegan los bytes, sin materializar el arreglo completo, de modo
+    que la memoria usada depende del tamaño de un bloque y no de la cadena.
+    Un elemento que ocupa varios chunks se vuelve a intentar decodificar recién
+    cuando lo pendiente duplica lo del intento anterior, así el costo total es
+    lineal aunque los bloques sean más grandes que un chunk.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    partes = []
+    largo = 0
+    minimo = 0
+    dentro = False
+
+    # None marca el fin de la respuesta: ahí se procesa lo pendiente sin esperar más datos
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is not None:
+            texto = utf8.decode(chunk)
+            partes.append(texto)
+            largo += len(texto)
+            if largo < minimo:
+                continue
+        buffer = ''.join(partes)
+        pos = 0
+        while True:
+            # Saltar espacios y separadores entre elementos
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            if not dentro:
+                if buffer[pos] != '[':
+                    raise ValueError("Se esperaba un arreglo JSON")
+                dentro = True
+                pos += 1
+                continue
+
+            if buffer[pos] == ']':
+                return
+
+            try:
+                elemento, fin = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Elemento incompleto: esperar el siguiente chunk
+                break
+            if buffer[pos] in '-0123456789' and (fin == len(buffer) or buffer[fin] not in ' \t\r\n,]'):
+                # Un número cortado por el borde del chunk (p. ej. "2" de "23" o "1.5" de "1.5e3")
+                # sigue en el próximo
+                break
+            pos = fin
+            yield elemento
+
+        resto = buffer[pos:]
+        partes = [resto] if resto else []
+        largo = len(resto)
+        minimo = 2 * largo
+
+    raise ValueError("Respuesta JSON incompleta")
+
+
+class AlmacenCadena:
+    """
+    Persistencia en disco del estado sincronizado de la cadena.
+    Se escribe en un archivo temporal y se renombra para no dejarlo corrupto
+    si la app se cierra a mitad de la escritura.
+    """
+
+    def __init__(self, ruta=CHAIN_STORE_PATH):
+        self.ruta = ruta
+
+    def cargar(self):
+        try:
+            with open(self.ruta, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error leyendo almacén de cadena: {e}")
+            return None
+
+    def guardar(self, estado):
+        tmp = f"{self.ruta}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(estado, f, separators=(',', ':'))
+            os.replace(tmp, self.ruta)
+        except Exception as e:
+            print(f"Error guardando almacén de cadena: {e}")
+
+    def borrar(self):
+        for ruta in (self.ruta, f"{self.ruta}.tmp"):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+# --- Caché de hashes de transacciones ---
+
+HASH_CACHE_PATH = 'vlc_tx_hashes.json'
+TAMANO_CACHE_HASHES = 4096
+
+
+class CacheHashes:
+    """
+    Caché LRU de hashes canónicos, indexada por los campos que identifican una
+    transacción (from/to/amount/nonce/signature). Evita volver a ordenar y
+    serializar la misma transacción en cada refresco. Se persiste junto al
+    almacén de la cadena.
+    """
+
+    def __init__(self, maximo=TAMANO_CACHE_HASHES, almacen=None):
+        self.maximo = maximo
+        self.almacen = almacen or AlmacenCadena(HASH_CACHE_PATH)
+        self.datos = OrderedDict()
+        self.lock = threading.Lock()
+        self.cargado = False
+        self.modificado = False
+
+    @staticmethod
+    def clave(tx):
+        # Sin firma no hay forma segura de distinguir dos transacciones iguales
+        # (p. ej. recompensas de minado), así que esas no se cachean
+        if not tx.get('signature'):
+            return None
+        try:
+            monto = repr(float(tx.get('amount') or 0))
+        except (TypeError, ValueError):
+            return None
+        return f"{tx.get('from')}|{tx.get('to')}|{monto}|{tx.get('nonce')}|{tx.get('signature')}"
+
+    def _cargar(self):
+        self.cargado = True
+        guardado = self.almacen.cargar() or []
+        for clave, tx_hash in guardado[-self.maximo:]:
+            self.datos[clave] = tx_hash
+
+    def hashes(self, txs):
+        """Hashes de una lista de transacciones, calculando solo los que faltan."""
+        resultado = []
+        with self.lock:
+            if not self.cargado:
+                self._cargar()
+            for tx in txs:
+                tx_hash = tx.get('hash')
+                if tx_hash:
+                    resultado.append(tx_hash)
+                    continue
+
+                clave = self.clave(tx)
+                tx_hash = self.datos.get(clave) if clave else None
+                if tx_hash:
+                    self.datos.move_to_end(clave)
+                else:
+                    tx_hash = calcular_tx_hash_completo(tx)
+                    if clave:
+                        self.datos[clave] = tx_hash
+                        self.modificado = True
+                        if len(self.datos) > self.maximo:
+                            self.datos.popitem(last=False)
+                resultado.append(tx_hash)
+        return resultado
+
+    def persistir(self):
+        with self.lock:
+            if not self.modificado:
+                return
+            datos = list(self.datos.items())
+            self.modificado = False
+        self.almacen.guardar(datos)
+
+    def borrar(self):
+        with self.lock:
+            self.datos.clear()
+            self.modificado = False
+        self.almacen.borrar()
+
+
+cache_hashes = CacheHashes()
+
+
+def calcular_tx_hashes(txs):
+    """Versión por lotes y cacheada de calcular_tx_hash_completo."""
+    return cache_hashes.hashes(txs)
+
+
+# --- Caché de detalles de transacciones confirmadas ---
+
+DETALLES_TX_PATH = 'vlc_tx_details.json'
+
+
+class CacheDetallesTx:
+    """
+    Respuestas de /tx/<hash> para transacciones confirmadas. Una transacción
+    confirmada no cambia, así que se guardan de forma permanente y volver a
+    abrir su detalle no requiere ir al nodo.
+    """
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen or AlmacenCadena(DETALLES_TX_PATH)
+        self.datos = None
+        self.lock = threading.Lock()
+
+    def _cargar(self):
+        if self.datos is None:
+            self.datos = self.almacen.cargar() or {}
+
+    def obtener(self, tx_hash):
+        with self.lock:
+            self._cargar()
+            return self.datos.get(tx_hash)
+
+    def guardar(self, tx_hash, datos):
+        if datos.get('status') != 'confirmed':
+            return
+        with self.lock:
+            self._cargar()
+            self.datos[tx_hash] = datos
+            copia = dict(self.datos)
+        self.almacen.guardar(copia)
+
+    def borrar(self):
+        with self.lock:
+            self.datos = None
+        self.almacen.borrar()
+
+
+cache_detalles_tx = CacheDetallesTx()
+
+
+# --- Último estado mostrado de la cuenta ---
+
+ESTADO_CUENTA_PATH = 'vlc_account.json'
+
+
+class CacheEstadoCuenta:
+    """
+    Último balance, historial (con pendientes) y altura sincronizada de la
+    wallet. Al arrancar se muestran al instante, marcados como
+    desactualizados, mientras el refresco trae los datos nuevos.
+    `generacion` cambia con cada borrar(): un refresco que empezó antes no
+    vuelve a escribir el archivo.
+    """
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen or AlmacenCadena(ESTADO_CUENTA_PATH)
+        self.estado = None
+        self.generacion = 0
+        self.lock = threading.Lock()
+
+    def obtener(self, address):
+        with self.lock:
+            if self.estado is None:
+                self.estado = self.almacen.cargar() or {}
+            if self.estado.get('address') != address:
+                return None
+            return dict(self.estado)
+
+    def guardar(self, address, generacion=None, **cambios):
+        """Actualiza solo los campos recibidos (balance, historial, altura) y persiste."""
+        with self.lock:
+            if generacion is not None and generacion != self.generacion:
+                return
+            if self.estado is None:
+                self.estado = self.almacen.cargar() or {}
+            if self.estado.get('address') != address:
+                self.estado = {'address': address}
+            if all(self.estado.get(k) == v for k, v in cambios.items()):
+                # Nada cambió desde el último refresco: no se reescribe el archivo
+                return
+            self.estado.update(cambios)
+            self.estado['actualizado_en'] = int(time.time())
+            # Se escribe con el lock tomado para que borrar() no quede antes que esta escritura
+            self.almacen.guardar(dict(self.estado))
+
+    def borrar(self):
+        with self.lock:
+            self.estado = None
+            self.generacion += 1
+            self.almacen.borrar()
+
+
+cache_estado_cuenta = CacheEstadoCuenta()
+
+
+class ReorganizacionDetectada(Exception):
+    """El nodo devolvió un bloque que no coincide con el hash guardado."""
+
+    def __init__(self, index):
+        super().__init__(f"Reorganización detectada en el bloque #{index}")
+        self.index = index
+
+
+class SincronizadorCadena:
+    """
+    Mantiene una copia local de las transacciones de una wallet.
+    Recuerda el último bloque sincronizado (índice y hash) y en cada refresco
+    solo procesa los bloques nuevos, por lo que el costo es O(bloques nuevos).
+    """
+
+    def __init__(self, address, almacen=None):
+        self.address = address
+        self.almacen = almacen or AlmacenCadena()
+        self.lock = threading.Lock()
+        # Aparte de `lock`, que se mantiene durante la descarga: descartar() no espera a la red
+        self.lock_almacen = threading.Lock()
+        self.descartado = False
+
+        estado = self.almacen.cargar()
+        if not estado or estado.get('address') != address:
+            estado = self._estado_vacio()
+        self.estado = estado
+        self._reconstruir_indices()
+
+    def _estado_vacio(self):
+        return {
+            "address": self.address,
+            "ultimo_index": -1,
+            "ultimo_hash": None,
+            # índice (como str, por JSON) -> block_hash de los últimos VENTANA_REORG bloques
+            "hashes_recientes": {},
+            "transacciones": []
+        }
+
+    @property
+    def altura(self):
+        return self.estado['ultimo_index']
+
+    def historial(self):
+        """Copia de las transacciones confirmadas de la wallet."""
+        with self.lock:
+            return list(self.estado['transacciones'])
+
+    # --- Índices en memoria (dirección -> txs y par (from, to) -> txs) ---
+
+    def _reconstruir_indices(self):
+        self.por_direccion = {}
+        self.por_par = {}
+        for registro in self.estado['transacciones']:
+            self._indexar(registro)
+
+    def _indexar(self, registro):
+        remitente = registro['remitente']
+        destinatario = registro['destinatario']
+        self.por_direccion.setdefault(remitente, []).append(registro)
+        if destinatario != remitente:
+            self.por_direccion.setdefault(destinatario, []).append(registro)
+        self.por_par.setdefault((remitente, destinatario), []).append(registro)
+
+    def transacciones_de(self, direccion):
+        """Transacciones sincronizadas donde `direccion` es remitente o destinatario."""
+        with self.lock:
+            return list(self.por_direccion.get(direccion, []))
+
+    def pagos(self, remitente, destinatario):
+        """Transacciones sincronizadas de `remitente` a `destinatario`."""
+        with self.lock:
+            return list(self.por_par.get((remitente, destinatario), []))
+
+    def sincronizar(self):
+        """Descarga los bloques nuevos, detecta reorganizaciones y persiste el resultado."""
+        with self.lock:
+            cambios = False
+            desde = self.estado['ultimo_index']
+            for _ in range(MAX_REINTENTOS_REORG):
+                try:
+                    cambios = self._sincronizar_desde(desde) or cambios
+                    break
+                except ReorganizacionDetectada as reorg:
+                    print(f"{reorg}, retrocediendo")
+                    self._retroceder(reorg.index)
+                    cambios = True
+                    # Volver a pedir toda la ventana para encontrar el punto de bifurcación de una vez
+                    recientes = self.estado['hashes_recientes']
+                    desde = min(map(int, recientes)) if recientes else -1
+            else:
+                # Demasiadas bifurcaciones seguidas: sincronizar desde el génesis
+                self.estado = self._estado_vacio()
+                self._reconstruir_indices()
+                self._sincronizar_desde(-1)
+
+            if cambios:
+                with self.lock_almacen:
+                    if not self.descartado:
+                        self.almacen.guardar(self.estado)
+                        cache_hashes.persistir()
+            return list(self.estado['transacciones'])
+
+    def descartar(self):
+        """Impide que una sincronización en curso vuelva a escribir el almacén (p. ej. al cerrar sesión)."""
+        with self.lock_almacen:
+            self.descartado = True
+
+    def _descargar_bloques(self, desde):
+        # Se pide también el último bloque conocido para comprobar su hash.
+        # Si el nodo ignora el parámetro y devuelve la cadena completa, los
+        # bloques ya conocidos se descartan sin procesar sus transacciones.
+        # La respuesta se parsea en streaming: cada bloque se procesa y se descarta
+        # antes de leer el siguiente.
+        with nodo.bloques(desde, stream=True) as r:
+            r.raise_for_status()
+            yield from iterar_arreglo_json(r.iter_content(chunk_size=TAMANO_CHUNK_BLOQUES))
+
+    def _sincronizar_desde(self, desde):
+        estado = self.estado
+        conocido_hasta = estado['ultimo_index']
+        vio_ultimo = conocido_hasta < 0
+        ultimo_visto = -1
+        cambios = False
+
+        for bloque in self._descargar_bloques(desde):
+            block_index = bloque.get('index', 0)
+            block_hash = bloque.get('block_hash', '')
+            ultimo_visto = max(ultimo_visto, block_index)
+
+            if block_index <= estado['ultimo_index']:
+                # Bloque ya sincronizado: solo verificar que sigue siendo el mismo
+                guardado = estado['hashes_recientes'].get(str(block_index))
+                if guardado is not None and guardado != block_hash:
+                    raise ReorganizacionDetectada(block_index)
+                if block_index == conocido_hasta:
+                    vio_ultimo = True
+                continue
+
+            previo = bloque.get('previous_hash')
+            if (previo and estado['ultimo_hash'] and
+                    block_index == estado['ultimo_index'] + 1 and previo != estado['ultimo_hash']):
+                raise ReorganizacionDetectada(estado['ultimo_index'])
+
+            timestamp = bloque.get('timestamp', 0)
+            relevantes = [
+                tx for tx in bloque.get('transactions', [])
+                if tx.get('from') == self.address or tx.get('to') == self.address
+            ]
+            if relevantes:
+                for tx, tx_hash in zip(relevantes, calcular_tx_hashes(relevantes)):
+                    registro = construir_registro_tx(tx, timestamp, block_index, block_hash, tx_hash)
+                    estado['transacciones'].append(registro)
+                    self._indexar(registro)
+
+            estado['ultimo_index'] = block_index
+            estado['ultimo_hash'] = block_hash
+            estado['hashes_recientes'][str(block_index)] = block_hash
+            estado['hashes_recientes'].pop(str(block_index - VENTANA_REORG), None)
+            cambios = True
+
+        if not vio_ultimo:
+            # La cadena del nodo es más corta que la nuestra (reinicio o reorganización)
+            raise ReorganizacionDetectada(ultimo_visto + 1 if ultimo_visto >= 0 else conocido_hasta)
+        return cambios
+
+    def _retroceder(self, index):
+        """Descarta los bloques desde `index` en adelante para volver a sincronizarlos."""
+        estado = self.estado
+        previo = index - 1
+        hash_previo = estado['hashes_recientes'].get(str(previo))
+
+        if previo < 0 or hash_previo is None:
+            # La bifurcación es más antigua que la ventana guardada: empezar de cero
+            self.estado = self._estado_vacio()
+            self._reconstruir_indices()
+            return
+
+        estado['transacciones'] = [
+            tx for tx in estado['transacciones'] if tx['block_index'] < index
+        ]
+        estado['hashes_recientes'] = {
+            k: v for k, v in estado['hashes_recientes'].items() if int(k) < index
+        }
+        estado['ultimo_index'] = previo
+        estado['ultimo_hash'] = hash_previo
+        self._reconstruir_indices()
+
+
+def construir_registro_tx(tx, timestamp, block_index=None, block_hash=None, tx_hash=None):
+    """Convierte una transacción del nodo al formato que usa el historial."""
+    # Usar hash del nodo si está disponible, sino calcular (con caché)
+    tx_hash_nodo = tx_hash or calcular_tx_hashes([tx])[0]
+
+    return {
+        "remitente": tx.get('from'),
+        "destinatario": tx.get('to'),
+        "monto": tx.get('amount'),
+        "nonce": tx.get('nonce'),
+        "public_key": tx.get('public_key'),
+        "signature": tx.get('signature'),
+        "timestamp": timestamp,
+        "block_index": block_index,
+        "block_hash": block_hash,
+        "tx_hash_completo": tx_hash_nodo,
+        "tx_hash_corto": calcular_tx_hash_corto(tx_hash_nodo)
+    }
+
+
+def registros_pendientes(mempool, address):
+    """Registros del historial (status 'pending') de las transacciones del mempool de `address`."""
+    pendientes = [tx for tx in mempool if tx.get('from') == address or tx.get('to') == address]
+    registros = []
+    for tx, tx_hash in zip(pendientes, calcular_tx_hashes(pendientes)):
+        registro = construir_registro_tx(tx, tx.get('timestamp', int(time.time())), tx_hash=tx_hash)
+        registro["status"] = "pending"
+        registros.append(registro)
+    return registros
+
+
+def ordenar_historial(historial):
+    """Ordena el historial del más reciente al más antiguo (en el lugar)."""
+    historial.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+    return historial
+
+
+def almacen_de_wallet(address, directorio='.'):
+    """Almacén de cadena propio de `address`, para procesos que siguen varias wallets."""
+    return AlmacenCadena(os.path.join(directorio, f"vlc_chain_{address}.json"))
+
+
+def pedir_balance(address):
+    """Pide el balance en el pool de red; devuelve el futuro."""
+    return pool_red.submit(nodo.saldo, address)
+
+
+def escanear_wallet(address, sincronizador=None, directorio='.', futuro_balance=None):
+    """
+    Balance, historial (confirmadas y pendientes) y altura sincronizada de una
+    dirección: lo mismo que muestra la pantalla principal, sin interfaz.
+
+    Sin `sincronizador`, cada dirección usa su propio almacén en `directorio`
+    (ver almacen_de_wallet). Si se pasa `futuro_balance` (ver pedir_balance),
+    el balance lo maneja quien llama y el resultado no lo incluye.
+    """
+    sincronizador = sincronizador or SincronizadorCadena(address, almacen_de_wallet(address, directorio))
+    esperar_balance = futuro_balance is None
+    if esperar_balance:
+        futuro_balance = pedir_balance(address)
+    futuro_mempool = pool_red.submit(lambda: nodo.mempool().json())
+
+    # Balance y mempool llegan en paralelo mientras este hilo sincroniza los bloques
+    sincronizador.sincronizar()
+    historial = sincronizador.transacciones_de(address)
+    try:
+        historial.extend(registros_pendientes(futuro_mempool.result(), address))
+    except Exception as e:
+        print(f"Error cargando mempool: {e}")
+
+    resultado = {
+        "historial": ordenar_historial(historial),
+        "altura": sincronizador.altura
+    }
+    if esperar_balance:
+        resultado["balance"] = futuro_balance.result()
+    return resultado
+
+
+# Backoff de las consultas /tx/<hash> mientras una transacción sigue pendiente
+ESPERA_INICIAL_CONFIRMACION = 2
+ESPERA_MAXIMA_CONFIRMACION = 30
+# Después de este tiempo se deja de seguir la transacción (el refresco normal la sigue mostrando)
+LIMITE_SEGUIMIENTO_CONFIRMACION = 10 * 60
+
+
+class SeguidorConfirmaciones:
+    """
+    Sigue transacciones pendientes hasta que entran en un bloque, consultando
+    /tx/<hash> con backoff exponencial. Entre consultas no hay ningún hilo
+    esperando: `programar(fn, segundos)` agenda la siguiente consulta (en la
+    app, con Clock) y cada consulta corre en el pool de red.
+    """
+
+    def __init__(self, programar, al_confirmar):
+        self.programar = programar
+        self.al_confirmar = al_confirmar
+        self.pendientes = {}
+        self.lock = threading.Lock()
+
+    def seguir(self, tx_hash):
+        with self.lock:
+            if tx_hash in self.pendientes:
+                return
+            self.pendientes[tx_hash] = {
+                "espera": ESPERA_INICIAL_CONFIRMACION,
+                "limite": time.time() + LIMITE_SEGUIMIENTO_CONFIRMACION
+            }
+        self.programar(lambda: pool_red.submit(self._consultar, tx_hash), ESPERA_INICIAL_CONFIRMACION)
+
+    def siguiendo(self):
+        with self.lock:
+            return set(self.pendientes)
+
+    def limpiar(self):
+        """Deja de seguir todo; las consultas ya programadas terminan sin consultar."""
+        with self.lock:
+            self.pendientes.clear()
+
+    def marcar_confirmadas(self, tx_hashes):
+        """Deja de seguir hashes que la sincronización ya vio confirmados."""
+        with self.lock:
+            for tx_hash in tx_hashes:
+                self.pendientes.pop(tx_hash, None)
+
+    def revisar_ahora(self):
+        """Consulta ya todos los pendientes (p. ej. justo después de minar un bloque)."""
+        for tx_hash in self.siguiendo():
+            pool_red.submit(self._consultar, tx_hash, False)
+
+    def _consultar(self, tx_hash, reprogramar=True):
+        with self.lock:
+            if tx_hash not in self.pendientes:
+                return
+
+        datos = consultar_tx_en_nodo(tx_hash)
+        if datos and (datos.get('status') == 'confirmed' or datos.get('block_index') is not None):
+            with self.lock:
+                if self.pendientes.pop(tx_hash, None) is None:
+                    return
+            cache_detalles_tx.guardar(tx_hash, datos)
+            self.al_confirmar(tx_hash, datos)
+            return
+
+        if not reprogramar:
+            return
+        with self.lock:
+            estado = self.pendientes.get(tx_hash)
+            if estado is None:
+                return
+            if time.time() > estado["limite"]:
+                print(f"Se deja de seguir la transacción {tx_hash[:16]}... (sin confirmar)")
+                del self.pendientes[tx_hash]
+                return
+            estado["espera"] = min(estado["espera"] * 2, ESPERA_MAXIMA_CONFIRMACION)
+            espera = estado["espera"]
+        self.programar(lambda: pool_red.submit(self._consultar, tx_hash), espera)
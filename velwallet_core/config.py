@@ -0,0 +1,18 @@
+"""
+Direcciones del nodo y del marketplace que usa la wallet.
+
+Se pueden cambiar con variables de entorno, p. ej. para apuntar la app o los
+benchmarks al servidor simulado (benchmarks/servidor_simulado.py):
+
+    VELWALLET_NODE_URL=http://127.0.0.1:8000 VELWALLET_MARKETPLACE_URL=http://127.0.0.1:8000 python main.py
+"""
+
+import os
+
+NODE_URL = os.environ.get("VELWALLET_NODE_URL", "https://velcoin-vlc-l3uk.onrender.com")
+MARKETPLACE_URL = os.environ.get("VELWALLET_MARKETPLACE_URL", "https://marketplace-node.onrender.com")
+
+# WALLET FUNDADORA (solo esta puede agregar productos). Recibe los pagos de las
+# compras, así que no se puede cambiar desde el entorno; el servidor simulado
+# tiene su propia opción --fundadora.
+WALLET_FUNDADORA = "421fe2ca5041d7fcc82f0abb96a7f03080c2e17c"
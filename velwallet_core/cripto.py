@@ -0,0 +1,99 @@
+"""Derivación de claves, firmas y hashes de transacciones (igual que el nodo)."""
+
+import hashlib
+import json
+import secrets
+import time
+
+
+def sha256(msg):
+    if isinstance(msg, str):
+        msg = msg.encode()
+    return hashlib.sha256(msg).hexdigest()
+
+def derivar_wallet_oficial(priv_hex):
+    try:
+        private_key = priv_hex.lower()
+        public_key = sha256(private_key)
+        address = sha256(public_key)[:40]
+        return address, public_key, private_key
+    except Exception as e:
+        print(f"Error derivando wallet: {e}")
+        return None, None, None
+
+def firmar_transaccion_nodo(public_key, sender, destinatario, monto, nonce):
+    try:
+        payload = f'{sender}{destinatario}{monto}{nonce}'
+        pub_key_hash = sha256(public_key)
+        signature = sha256(pub_key_hash + payload)
+        return signature
+    except Exception as e:
+        print(f"Error en firma: {e}")
+        return None
+        
+def firmar_challenge(public_key, challenge):
+    try:
+        pub_key_hash = sha256(public_key)
+        signature = sha256(pub_key_hash + challenge)
+        return signature
+    except Exception as e:
+        print(f"Error firmando challenge: {e}")
+        return None
+
+
+def nueva_clave_privada():
+    """Clave privada nueva: 64 caracteres hexadecimales."""
+    return ''.join(secrets.choice('0123456789abcdef') for _ in range(64))
+
+
+def construir_transaccion(sender, public_key, destinatario, monto, nonce=None):
+    """Payload firmado listo para /send, o None si no se pudo firmar."""
+    if nonce is None:
+        nonce = int(time.time() * 1000)
+    firma = firmar_transaccion_nodo(public_key, sender, destinatario, monto, nonce)
+    if not firma:
+        return None
+    return {
+        "from": sender,
+        "to": destinatario,
+        "amount": monto,
+        "nonce": nonce,
+        "public_key": public_key,
+        "signature": firma
+    }
+
+
+def calcular_tx_hash_completo(tx):
+    """
+    Calcula el hash canónico EXACTO como el nodo.
+    IMPORTANTE: El nodo excluye el campo 'hash' al calcular.
+    """
+    try:
+        # EXCLUIR siempre el campo 'hash' (igual que el nodo)
+        tx_limpio = {}
+        
+        for campo in sorted(tx.keys()):
+            if campo == 'hash':
+                continue
+            
+            valor = tx[campo]
+            
+            # Normalizar tipos exactamente como el nodo
+            if campo == 'amount':
+                tx_limpio[campo] = float(valor)
+            elif campo in ['nonce', 'timestamp', 'received_at']:
+                tx_limpio[campo] = int(valor) if valor else 0
+            else:
+                tx_limpio[campo] = str(valor) if valor else ""
+        
+        # JSON con separadores EXACTOS de Python por defecto
+        json_str = json.dumps(tx_limpio, sort_keys=True, separators=(', ', ': '))
+        return sha256(json_str)
+        
+    except Exception as e:
+        print(f"Error calculando hash: {e}")
+        return tx.get('hash', 'ERROR')
+        
+def calcular_tx_hash_corto(tx_hash_completo):
+    """Versión corta para mostrar (primeros 16 caracteres)"""
+    return tx_hash_completo[:16] if tx_hash_completo else 'N/A'
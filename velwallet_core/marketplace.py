@@ -0,0 +1,527 @@
+"""
+Autenticación en el marketplace, catálogo de productos y compras de la
+wallet (guardadas y reconstruidas desde los pagos en la cadena).
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from .config import MARKETPLACE_URL
+from .cripto import sha256, firmar_challenge
+from .nodo import SesionPerezosa
+from .cadena import AlmacenCadena
+
+
+# Sesión persistente para el marketplace (mantiene cookies de autenticación)
+marketplace_session = SesionPerezosa()
+
+def autenticar_en_marketplace(wallet, pub_key):
+    """
+    Autentica al usuario en el marketplace y devuelve True si tuvo éxito.
+    Usa la sesión global para mantener las cookies.
+    """
+    try:
+        # 1. Solicitar challenge
+        r_challenge = marketplace_session.post(
+            f"{MARKETPLACE_URL}/auth/challenge",
+            json={"wallet": wallet},
+            timeout=10
+        )
+        
+        if r_challenge.status_code != 200:
+            print(f"Error obteniendo challenge: {r_challenge.status_code}")
+            return False
+        
+        challenge = r_challenge.json().get('challenge')
+        if not challenge:
+            print("No se recibió challenge")
+            return False
+        
+        # 2. Firmar challenge
+        signature = firmar_challenge(pub_key, challenge)
+        if not signature:
+            print("Error firmando challenge")
+            return False
+        
+        # 3. Verificar firma
+        r_verify = marketplace_session.post(
+            f"{MARKETPLACE_URL}/auth/verify",
+            json={
+                "wallet": wallet,
+                "public_key": pub_key,
+                "signature": signature
+            },
+            timeout=10
+        )
+        
+        if r_verify.status_code == 200:
+            print(f"Autenticación exitosa para {wallet[:16]}...")
+            return True
+        else:
+            print(f"Verificación fallida: {r_verify.status_code} - {r_verify.text}")
+            return False
+            
+    except Exception as e:
+        print(f"Error en autenticación: {e}")
+        return False
+
+# Duración asumida de la sesión del marketplace cuando las cookies no traen expiración
+TTL_SESION_MARKETPLACE = 15 * 60
+# Margen para re-autenticar antes de que la cookie expire realmente
+MARGEN_EXPIRACION = 30
+
+
+class GestorAutenticacion:
+    """
+    Mantiene la sesión autenticada del marketplace y la reutiliza mientras
+    sea válida. Solo repite el handshake challenge/verify cuando la sesión
+    expiró o el servidor responde 401. Dos pantallas que necesitan
+    autenticarse a la vez comparten un único handshake: la segunda espera el
+    Future del intento en curso. El lock solo protege el estado y nunca se
+    mantiene durante la red, así cerrar_sesion() no bloquea la UI.
+    """
+
+    def __init__(self, session, ttl=TTL_SESION_MARKETPLACE):
+        self.session = session
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.wallet = None
+        self.pub_key = None
+        self.expira = 0
+        # Se incrementa en cada handshake; evita que un 401 de una petición
+        # hecha con la sesión anterior invalide una sesión recién creada
+        self.generacion = 0
+        # (wallet, Future) del handshake en curso
+        self.en_curso = None
+        # Se incrementa en cada cierre de sesión; descarta handshakes que terminan después
+        self.cierres = 0
+
+    def _vigente(self, wallet):
+        return self.wallet == wallet and time.time() < self.expira
+
+    def _calcular_expiracion(self):
+        expiraciones = [c.expires for c in self.session.cookies if c.expires]
+        if expiraciones:
+            return min(expiraciones) - MARGEN_EXPIRACION
+        return time.time() + self.ttl - MARGEN_EXPIRACION
+
+    def asegurar(self, wallet, pub_key):
+        """Devuelve True si hay una sesión válida para `wallet`, autenticando solo si hace falta."""
+        if self._vigente(wallet):
+            return True
+        with self.lock:
+            # Otro hilo pudo haber autenticado mientras esperábamos el lock
+            if self._vigente(wallet):
+                return True
+            intento = self.en_curso
+            propio = intento is None or intento[0] != wallet
+            if propio:
+                intento = (wallet, Future())
+                self.en_curso = intento
+                cierres = self.cierres
+        if not propio:
+            return intento[1].result()
+
+        exito = False
+        try:
+            exito = autenticar_en_marketplace(wallet, pub_key)
+        finally:
+            with self.lock:
+                if self.en_curso is intento:
+                    self.en_curso = None
+                if self.cierres != cierres:
+                    # Se cerró sesión durante el handshake: la cookie recibida no vale
+                    exito = False
+                    self.session.cookies.clear()
+                elif exito:
+                    self.wallet = wallet
+                    self.pub_key = pub_key
+                    self.expira = self._calcular_expiracion()
+                    self.generacion += 1
+                else:
+                    self.wallet = None
+            intento[1].set_result(exito)
+        return exito
+
+    def invalidar(self, generacion=None):
+        with self.lock:
+            if generacion is None or generacion == self.generacion:
+                self.expira = 0
+
+    def cerrar_sesion(self):
+        with self.lock:
+            self.wallet = None
+            self.pub_key = None
+            self.expira = 0
+            self.en_curso = None
+            self.cierres += 1
+            self.session.cookies.clear()
+
+    def peticion(self, metodo, url, **kwargs):
+        """Petición con la sesión del marketplace; ante un 401 re-autentica y reintenta una vez."""
+        generacion = self.generacion
+        r = self.session.request(metodo, url, **kwargs)
+        if r.status_code == 401 and self.wallet:
+            print("Sesión del marketplace expirada, re-autenticando")
+            self.invalidar(generacion)
+            if self.asegurar(self.wallet, self.pub_key):
+                r = self.session.request(metodo, url, **kwargs)
+        return r
+
+    def get(self, url, **kwargs):
+        return self.peticion("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.peticion("POST", url, **kwargs)
+
+
+gestor_auth = GestorAutenticacion(marketplace_session)
+
+
+DERECHOS_PATH = 'vlc_entitlements.json'
+# Máximo de sondeos /download/<id> simultáneos al cargar "Mis Compras"
+MAX_SONDEOS_DESCARGA = 6
+
+
+class CacheDerechosDescarga:
+    """
+    Productos para los que el marketplace ya confirmó acceso de descarga,
+    por wallet. Un acceso confirmado no se pierde, así que al volver a abrir
+    "Mis Compras" esos productos no se vuelven a sondear.
+    """
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen or AlmacenCadena(DERECHOS_PATH)
+        self.datos = None
+        self.lock = threading.Lock()
+
+    def _cargar(self):
+        if self.datos is None:
+            self.datos = {w: set(ids) for w, ids in (self.almacen.cargar() or {}).items()}
+
+    def productos(self, wallet):
+        with self.lock:
+            self._cargar()
+            return set(self.datos.get(wallet, ()))
+
+    def agregar(self, wallet, product_id):
+        with self.lock:
+            self._cargar()
+            ids = self.datos.setdefault(wallet, set())
+            if product_id in ids:
+                return
+            ids.add(product_id)
+            copia = {w: sorted(i) for w, i in self.datos.items()}
+        self.almacen.guardar(copia)
+
+    def borrar(self):
+        with self.lock:
+            self.datos = None
+        self.almacen.borrar()
+
+
+cache_derechos = CacheDerechosDescarga()
+
+
+COMPRAS_PATH = 'vlc_purchases.json'
+
+
+class AlmacenCompras:
+    """
+    Compras de cada wallet (product_id, tx_hash, timestamp, status, título y
+    precio) persistidas en disco, para mostrar "Mis Compras" al instante tras
+    un reinicio sin reconstruirlas desde la cadena.
+    """
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen or AlmacenCadena(COMPRAS_PATH)
+        self.datos = None
+        self.lock = threading.Lock()
+
+    def _cargar(self):
+        if self.datos is None:
+            self.datos = self.almacen.cargar() or {}
+
+    def listar(self, wallet):
+        with self.lock:
+            self._cargar()
+            return [dict(c) for c in self.datos.get(wallet, [])]
+
+    def agregar(self, wallet, compras):
+        """Guarda las compras nuevas; devuelve True si alguna no estaba registrada."""
+        with self.lock:
+            self._cargar()
+            guardadas = self.datos.setdefault(wallet, [])
+            por_id = {c['product_id']: c for c in guardadas}
+            cambios = False
+            for compra in compras:
+                previa = por_id.get(compra['product_id'])
+                if previa is None:
+                    previa = dict(compra)
+                    guardadas.append(previa)
+                    por_id[compra['product_id']] = previa
+                    cambios = True
+                    continue
+                # Completar datos que la compra guardada no tenía (p. ej. el tx_hash)
+                for campo, valor in compra.items():
+                    if valor is not None and previa.get(campo) is None:
+                        previa[campo] = valor
+                        cambios = True
+            if not cambios:
+                return False
+            copia = {w: [dict(c) for c in cs] for w, cs in self.datos.items()}
+        self.almacen.guardar(copia)
+        return True
+
+    def borrar(self):
+        with self.lock:
+            self.datos = None
+        self.almacen.borrar()
+
+
+almacen_compras = AlmacenCompras()
+
+
+CATALOGO_PATH = 'vlc_catalog.json'
+# Segundos durante los que el catálogo en memoria se usa sin revalidar
+FRESCURA_CATALOGO = 60
+
+
+class CatalogoProductos:
+    """
+    Copia compartida del catálogo del marketplace (la usan el popup del
+    marketplace y la reconstrucción de compras). Se revalida con
+    If-None-Match / If-Modified-Since, así que si el catálogo no cambió el
+    servidor responde 304 sin cuerpo. También se guarda en disco para tener
+    catálogo al instante la próxima vez; la copia guardada se lee recién en el
+    primer uso, no al arrancar.
+    """
+
+    def __init__(self, session, almacen=None, frescura=FRESCURA_CATALOGO):
+        self.session = session
+        self.almacen = almacen or AlmacenCadena(CATALOGO_PATH)
+        self.frescura = frescura
+        # Protege solo el estado; nunca se mantiene durante la petición a /products
+        self.lock = threading.Lock()
+        self.productos = None
+        self.etag = None
+        self.last_modified = None
+        self.revalidado_en = 0
+        # Cambia con cada catálogo nuevo y con borrar(); los índices se guardan con la versión de la que salieron
+        self.version = 0
+        self.indices = {}
+        # Future de la revalidación en curso, compartido por las llamadas concurrentes
+        self.en_curso = None
+        # Lock aparte: en_memoria() no debe esperar a una revalidación en curso
+        self.lock_carga = threading.Lock()
+        self.cargado = False
+
+    def _cargar_guardado(self):
+        if self.cargado:
+            return
+        with self.lock_carga:
+            if self.cargado:
+                return
+            guardado = self.almacen.cargar()
+            if guardado and self.productos is None:
+                self.productos = guardado.get('productos')
+                self.etag = guardado.get('etag')
+                self.last_modified = guardado.get('last_modified')
+            self.cargado = True
+
+    def en_memoria(self):
+        """Catálogo conocido sin ir a la red (puede estar desactualizado) o None."""
+        self._cargar_guardado()
+        return self.productos
+
+    def obtener(self, forzar=False):
+        """
+        Devuelve el catálogo revalidándolo si pasó el tiempo de frescura.
+        Llamadas concurrentes comparten una sola petición. Si el servidor no
+        responde se usa la última copia conocida.
+        """
+        return self._obtener(forzar)[0]
+
+    def _obtener(self, forzar=False):
+        """(productos, versión) del catálogo; ver obtener()."""
+        self._cargar_guardado()
+        while True:
+            with self.lock:
+                if (not forzar and self.productos is not None and
+                        time.time() - self.revalidado_en < self.frescura):
+                    return self.productos, self.version
+                intento = self.en_curso
+                if intento is None:
+                    intento = self.en_curso = Future()
+                    version = self.version
+                    conocidos = self.productos
+                    headers = {}
+                    if conocidos is not None:
+                        if self.etag:
+                            headers['If-None-Match'] = self.etag
+                        if self.last_modified:
+                            headers['If-Modified-Since'] = self.last_modified
+                    break
+            if not forzar:
+                return intento.result()
+            # Forzado: la petición en curso pudo salir antes del cambio que se quiere ver;
+            # se espera a que termine y se hace una nueva
+            try:
+                intento.result()
+            except Exception:
+                pass
+
+        try:
+            resultado = self._revalidar(headers, version, conocidos)
+        except Exception as e:
+            with self.lock:
+                if self.en_curso is intento:
+                    self.en_curso = None
+            intento.set_exception(e)
+            raise
+        intento.set_result(resultado)
+        return resultado
+
+    def _revalidar(self, headers, version, conocidos):
+        productos = None
+        try:
+            r = self.session.get(f"{MARKETPLACE_URL}/products", headers=headers, timeout=10)
+            if r.status_code != 304:
+                r.raise_for_status()
+                productos = r.json()
+        except Exception:
+            if conocidos is None:
+                raise
+            with self.lock:
+                self.en_curso = None
+            return conocidos, version
+
+        with self.lock:
+            self.en_curso = None
+            if self.version != version:
+                # borrar() (cierre de sesión) durante la petición: no se guarda lo recibido
+                return (productos if productos is not None else conocidos), version
+            self.revalidado_en = time.time()
+            if productos is None:
+                return conocidos, version
+            self.productos = productos
+            self.etag = r.headers.get('ETag')
+            self.last_modified = r.headers.get('Last-Modified')
+            self.version += 1
+            self.indices = {}
+            # Se escribe con el lock tomado para que borrar() no quede antes que esta escritura
+            self.almacen.guardar({
+                "productos": productos,
+                "etag": self.etag,
+                "last_modified": self.last_modified
+            })
+            return productos, self.version
+
+    def _indice(self, nombre, construir):
+        """Índice `nombre` del catálogo, construido una vez por versión a partir de la misma copia."""
+        productos, version = self._obtener()
+        with self.lock:
+            guardado = self.indices.get(nombre)
+            if guardado and guardado[0] == version:
+                return guardado[1]
+        indice = construir(productos)
+        with self.lock:
+            if self.version == version:
+                self.indices[nombre] = (version, indice)
+        return indice
+
+    def por_id(self):
+        """Productos indexados por id (se calcula una vez por versión del catálogo)."""
+        return self._indice('por_id', lambda productos: {p['id']: p for p in productos})
+
+    def indice_precios(self):
+        """Índice de precios del catálogo (ver indexar_por_precio), compartido y cacheado."""
+        return self._indice('precios', indexar_por_precio)
+
+    def borrar(self):
+        with self.lock:
+            self.productos = None
+            self.etag = None
+            self.last_modified = None
+            self.revalidado_en = 0
+            self.version += 1
+            self.indices = {}
+            self.cargado = True
+            self.almacen.borrar()
+
+
+catalogo = CatalogoProductos(marketplace_session)
+pool_sondeos = ThreadPoolExecutor(max_workers=MAX_SONDEOS_DESCARGA, thread_name_prefix="sondeo")
+
+
+def compra_desde_producto(product, tx=None):
+    """
+    Registro de compra (formato de "Mis Compras") a partir de un producto del
+    catálogo y, si se conoce, del pago que la originó.
+    """
+    return {
+        'product_id': product['id'],
+        'title': product.get('title', 'Producto'),
+        'price': product.get('price', 0),
+        'status': 'completed',
+        'timestamp': tx.get('timestamp') if tx else None,
+        'tx_hash': tx.get('tx_hash_completo') if tx else None
+    }
+
+
+def indexar_por_precio(products):
+    """Índice precio en centavos -> productos, para encontrar un producto por monto en O(1)."""
+    indice = {}
+    for product in products:
+        try:
+            centavos = round(float(product.get('price', 0)) * 100)
+        except (TypeError, ValueError):
+            continue
+        indice.setdefault(centavos, []).append(product)
+    return indice
+
+
+def productos_con_precio(indice, monto):
+    """Productos cuyo precio difiere de `monto` en menos de 0.01 VLC."""
+    centavos = round(monto * 100)
+    # Con una tolerancia de 0.01 el precio solo puede caer en el centavo vecino
+    return [
+        product
+        for c in (centavos - 1, centavos, centavos + 1)
+        for product in indice.get(c, ())
+        if abs(float(product.get('price', 0)) - monto) < 0.01
+    ]
+
+
+def reconstruir_compras(pagos, indice_precios, compras):
+    """
+    Agrega a `compras` los productos cuyo precio coincide con algún pago a la
+    wallet fundadora. Lineal en la cantidad de pagos.
+    """
+    ids_compras = {c['product_id'] for c in compras}
+    for tx in pagos:
+        monto = float(tx.get('monto') or 0)
+        # Buscar producto con ese precio
+        for product in productos_con_precio(indice_precios, monto):
+            if product['id'] not in ids_compras:
+                ids_compras.add(product['id'])
+                compras.append(compra_desde_producto(product, tx))
+    return compras
+
+
+def url_descarga_firmada(wallet, pub_key, product_id, vigencia=30 * 60):
+    """
+    URL de descarga con token temporal: firma de wallet + product_id +
+    expiración hecha con la pub_key (nunca con la clave privada).
+    """
+    expira = int(time.time()) + vigencia
+    firma = sha256(sha256(pub_key) + f"{wallet}:{product_id}:{expira}")
+    params = {
+        'wallet': wallet,
+        'pubkey': pub_key,
+        'expires': expira,
+        'signature': firma
+    }
+    return f"{MARKETPLACE_URL}/download/{product_id}?{urlencode(params)}"
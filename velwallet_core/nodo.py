@@ -0,0 +1,155 @@
+"""Cliente HTTP del nodo VelCoin."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import NODE_URL
+
+
+# Timeouts (conexión, lectura) por endpoint del nodo
+TIMEOUTS_NODO = {
+    "balance": (5, 10),
+    "blocks": (5, 10),
+    "mempool": (5, 10),
+    "tx": (5, 10),
+    "send": (5, 10),
+    "mine": (5, 30),
+}
+
+
+class SesionPerezosa:
+    """
+    requests.Session que se crea en el primer uso, así importar el núcleo (y
+    arrancar la app) no paga el import de requests. Todo lo demás se delega
+    en la sesión real.
+    """
+
+    def __init__(self, configurar=None):
+        self._configurar = configurar
+        self._sesion = None
+        self._lock = threading.Lock()
+
+    def _obtener(self):
+        if self._sesion is None:
+            with self._lock:
+                if self._sesion is None:
+                    import requests
+                    sesion = requests.Session()
+                    if self._configurar:
+                        self._configurar(sesion)
+                    self._sesion = sesion
+        return self._sesion
+
+    def __getattr__(self, nombre):
+        return getattr(self._obtener(), nombre)
+
+
+def politica_reintentos(total, backoff):
+    """
+    Retry de urllib3 para los GET del nodo. Se reintentan fallos de conexión,
+    502/503/504 y una vez las conexiones cortadas (p. ej. un socket keep-alive
+    que el servidor ya cerró). Un timeout de lectura no se repite: un nodo que
+    no responde se informa en un solo timeout y no en varios seguidos.
+    """
+    from urllib3.exceptions import ReadTimeoutError
+    from urllib3.util.retry import Retry
+
+    class ReintentosNodo(Retry):
+        def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+            if isinstance(error, ReadTimeoutError):
+                raise error
+            return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    return ReintentosNodo(
+        total=total,
+        connect=1,
+        read=1,
+        backoff_factor=backoff,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False
+    )
+
+
+class ClienteNodo:
+    """
+    Cliente HTTP compartido para todas las llamadas al nodo.
+    Reutiliza conexiones (keep-alive) para no pagar un handshake TCP+TLS en
+    cada petición y reintenta con backoff solo los GET, que son idempotentes,
+    ante fallos de conexión o 502/503/504.
+    Los POST (/send, /mine) nunca se reintentan automáticamente.
+    """
+
+    def __init__(self, base_url, timeouts=None, reintentos=3, backoff=0.5):
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = dict(TIMEOUTS_NODO, **(timeouts or {}))
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.session = SesionPerezosa(self._configurar_sesion)
+
+    def _configurar_sesion(self, session):
+        from requests.adapters import HTTPAdapter
+
+        retry = politica_reintentos(self.reintentos, self.backoff)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=retry)
+
+        session.headers.update({"Connection": "keep-alive"})
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    def url(self, ruta):
+        return f"{self.base_url}{ruta}"
+
+    def get(self, endpoint, ruta, **kwargs):
+        kwargs.setdefault("timeout", self.timeouts[endpoint])
+        return self.session.get(self.url(ruta), **kwargs)
+
+    def post(self, endpoint, ruta, **kwargs):
+        kwargs.setdefault("timeout", self.timeouts[endpoint])
+        return self.session.post(self.url(ruta), **kwargs)
+
+    def balance(self, addr):
+        return self.get("balance", f"/balance/{addr}")
+
+    def saldo(self, addr):
+        """Balance de `addr` como número (0 si el nodo no lo informa)."""
+        return self.balance(addr).json().get('balance', 0)
+
+    def bloques(self, desde=0, stream=False):
+        return self.get("blocks", "/blocks", params={"start": max(desde, 0)}, stream=stream)
+
+    def mempool(self):
+        return self.get("mempool", "/mempool")
+
+    def tx(self, tx_hash):
+        return self.get("tx", f"/tx/{tx_hash}")
+
+    def enviar(self, payload):
+        return self.post("send", "/send", json=payload)
+
+    def minar(self):
+        return self.post("mine", "/mine", json={})
+
+
+nodo = ClienteNodo(NODE_URL)
+
+# Hilos para peticiones de red que se lanzan en paralelo (balance, mempool, ...)
+pool_red = ThreadPoolExecutor(max_workers=4, thread_name_prefix="red")
+
+# /mine puede tardar hasta su timeout de lectura: va en su propio hilo para no
+# demorar los refrescos ni las consultas de confirmación de pool_red
+pool_minado = ThreadPoolExecutor(max_workers=1, thread_name_prefix="minado")
+
+
+def consultar_tx_en_nodo(tx_hash):
+    """
+    Consulta una transacción específica al nodo para obtener datos oficiales.
+    """
+    try:
+        response = nodo.tx(tx_hash)
+        if response.status_code == 200:
+            return response.json()
+        return None
+    except Exception as e:
+        print(f"Error consultando TX al nodo: {e}")
+        return None
@@ -0,0 +1,61 @@
+"""Datos de la wallet guardados en el dispositivo."""
+
+import json
+import os
+import threading
+
+WALLET_STORE_PATH = 'vlc_secure.json'
+
+
+class EstadoWallet:
+    """
+    Datos de la wallet (address, pub, priv) leídos del disco una sola vez.
+    Las lecturas salen de memoria y los cambios se escriben en el archivo en
+    el mismo momento (write-through). El formato es el mismo que usaba el
+    JsonStore de Kivy ({"user": {...}}), así que las wallets existentes se
+    siguen leyendo.
+    """
+
+    def __init__(self, ruta=WALLET_STORE_PATH):
+        self.ruta = ruta
+        self.usuario = None
+        self.lock = threading.Lock()
+
+    def cargar(self):
+        try:
+            with open(self.ruta, 'r') as f:
+                datos = json.load(f)
+        except FileNotFoundError:
+            datos = {}
+        with self.lock:
+            self.usuario = dict(datos['user']) if 'user' in datos else None
+
+    @property
+    def existe(self):
+        return self.usuario is not None
+
+    @property
+    def address(self):
+        return self.usuario['address']
+
+    @property
+    def pub(self):
+        return self.usuario['pub']
+
+    def guardar_usuario(self, address, pub, priv):
+        usuario = {"address": address, "pub": pub, "priv": priv}
+        with self.lock:
+            tmp = f"{self.ruta}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"user": usuario}, f)
+            os.replace(tmp, self.ruta)
+            self.usuario = usuario
+
+    def borrar(self):
+        with self.lock:
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+            self.usuario = None
+
+
+estado_wallet = EstadoWallet()